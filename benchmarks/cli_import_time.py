@@ -0,0 +1,95 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Measures how long `requiem --help` spends importing modules using `python -X importtime`.
+Modules the interpreter imports on its own, like site, are left out of the total.
+Exits with a non zero status if the budget is exceeded or any runtime dependency is imported.
+
+    python benchmarks/cli_import_time.py [--budget MILLISECONDS] [--runs N] [--top N]
+"""
+
+
+import subprocess
+import argparse
+import pathlib
+import typing
+import sys
+import os
+
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+HEAVY = ("hikari", "lightbulb", "aerich", "tortoise", "asyncpg", "aiohttp", "yaml", "requests", "pwpy")
+INTERPRETER = ("site", "encodings", "_frozen_importlib_external", "zipimport", "_io", "marshal", "posix", "_codecs")
+SCRIPT = "import sys; sys.argv = ['requiem', '--help']; from requiem.__main__ import cli; cli()"
+
+
+def measure() -> typing.Dict[str, int]:
+    """
+    Runs `requiem --help` in a fresh interpreter and returns the cumulative import time of each module in microseconds.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join((str(ROOT), str(ROOT / "requiem"))))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        cwd=ROOT / "requiem",
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name[1:].rstrip()] = int(cumulative)
+
+    return modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=100.0, help="import budget in milliseconds")
+    parser.add_argument("--runs", type=int, default=5, help="runs to take the best of")
+    parser.add_argument("--top", type=int, default=10, help="heaviest top level imports to show")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(max(args.runs, 1))]
+    totals = [
+        sum(time for name, time in run.items() if name not in INTERPRETER and not name.startswith(" ")) / 1000
+        for run in runs
+    ]
+    best = min(range(len(runs)), key=totals.__getitem__)
+    modules = runs[best]
+
+    print(f"imports took {totals[best]:.1f}ms (best of {len(runs)}), budget is {args.budget:.1f}ms")
+
+    for name, time in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{time / 1000:>8.1f}ms  {name.strip()}")
+
+    heavy = sorted({name.strip() for name in modules if name.strip().split(".")[0] in HEAVY})
+
+    if heavy:
+        print(f"runtime dependencies were imported: {', '.join(heavy)}")
+
+    return 1 if heavy or totals[best] > args.budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,32 +16,33 @@
 
 
 from requiem import __version__
-from lib import setup, client
+from lib import DATA_DIR, updates
 
 import click
 import importlib
-import requests
-import re
 
 
-@click.group()
-def cli() -> None:
-    try:
-        page = requests.get("https://raw.githubusercontent.com/GodEmpressVerin/requiem/main/requiem/__init__.py")
-        match = re.findall(r"(?<=__version__ = ).*", page.text)
+# The runtime stack (hikari, lightbulb, tortoise, aerich, aiohttp, yaml) is only imported by the commands that use it,
+# keeping `requiem --help` and `requiem version` fast. Run benchmarks/cli_import_time.py after touching imports here.
 
-        if match:
-            current_version = __version__
-            latest_version = match[0].strip('"')
 
-            if current_version != latest_version:
-                click.echo(f"a newer version of requiem is available, consider upgrading to {latest_version}")
+@click.group()
+@click.option(
+    "--skip-update-check",
+    help="Don't check github for a newer version of Requiem.",
+    envvar="REQUIEM_SKIP_UPDATE_CHECK",
+    is_flag=True,
+)
+@click.pass_context
+def cli(ctx: click.Context, skip_update_check: bool) -> None:
+    if skip_update_check:
+        return
 
-        else:
-            click.echo("requiem was unable to check for updates!")
+    if ctx.invoked_subcommand == "start":
+        updates.check_in_background(DATA_DIR)
 
-    except requests.ConnectionError:
-        click.echo("requiem was unable to connect github to check for updates!")
+    else:
+        updates.check(DATA_DIR)
 
 
 @cli.command()
@@ -53,7 +54,8 @@ def version() -> None:
 
 @cli.command()
 @click.option("--debug", help="Start Requiem in debug mode.", is_flag=True)
-def start(debug: bool) -> None:
+@click.option("--boot-profile", help="Write a cProfile dump of the boot to the app data directory.", is_flag=True)
+def start(debug: bool, boot_profile: bool) -> None:
     """Run Requiem."""
     if debug:
         confirm = click.confirm("start requiem in debug mode? performance may be impacted!")
@@ -64,16 +66,30 @@ def start(debug: bool) -> None:
         else:
             debug = False
 
-    client.start_failsafe(debug)
+    from lib import client
+
+    client.start_failsafe(debug, boot_profile)
+
+
+@cli.command()
+def migrate() -> None:
+    """Migrate the database, even if the models look unchanged."""
+    from lib import client
+
+    client.run_migrations()
 
 
 @cli.command()
 def configure():
     """Run the Requiem configuration utility."""
+    from lib import setup
+
     setup.run_config()
 
 
 if __name__ == "__main__":
+    from lib import client
+
     client.start_failsafe(False)
 
 
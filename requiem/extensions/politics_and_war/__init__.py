@@ -15,7 +15,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from extensions.politics_and_war import commands
+from extensions.politics_and_war import manifest, sync
 from lib import client
 
 import lightbulb
@@ -23,13 +23,35 @@ import sys
 
 
 plugin = lightbulb.Plugin("Politics And War")
-plugin.command(commands.infra)
+plugin.command(manifest.infra)
+plugin.command(manifest.targets)
+plugin.command(manifest.alliance)
+plugin.command(manifest.growth)
 
 
 def load(bot: client.Requiem) -> None:
+    sync.identities.load(client.DATA_DIR)
+    sync.key_pool.configure(
+        bot.config.pnw_api_keys,
+        bot.config.pnw_requests_per_minute / 60,
+        bot.config.pnw_request_burst,
+    )
+
+    trigger = sync.sync_scheduler.trigger
+    trigger.interval = bot.config.pnw_sync_interval
+    trigger.jitter = bot.config.pnw_sync_jitter
+    trigger.backoff = bot.config.pnw_sync_backoff
+    trigger.max_backoff = bot.config.pnw_sync_max_backoff
+
+    manifest.handlers.bind(bot)
     bot.add_plugin(plugin)
+    sync.sync_task.start()
 
 
 def unload(bot: client.Requiem) -> None:
     bot.remove_plugin(plugin)
-    del sys.modules[commands.__name__]
+    sync.sync_task.cancel()
+    sync.key_pool.stop()
+    manifest.handlers.unload()
+    del sys.modules[manifest.__name__]
+    del sys.modules[sync.__name__]
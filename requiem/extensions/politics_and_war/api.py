@@ -0,0 +1,410 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from pwpy import exceptions
+
+import asyncio
+import codecs
+import collections
+import json
+import logging
+import random
+import re
+import time
+import typing
+import aiohttp
+
+
+_LOGGER = logging.getLogger("requiem.politics_and_war")
+_PAGE_START = re.compile(r'"(\w+)"\s*:\s*\{\s*"data"\s*:\s*\[')
+_MAX_ROW = 1 << 20
+API_URL = "https://api.politicsandwar.com/graphql"
+T = typing.TypeVar("T")
+
+
+class RateLimited(Exception):
+    """
+    Raised when the api rejects a request for exceeding the rate limit.
+    """
+
+    def __init__(self, retry_after: typing.Optional[float]) -> None:
+        super().__init__("the politics and war api has rate limited this key!")
+        self.retry_after = retry_after
+
+
+class NoKeysConfigured(Exception):
+    """
+    Raised when a request is made without any politics and war api keys configured.
+    """
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to capacity requests and refills at rate tokens per second.
+    """
+
+    __slots__: typing.List[str] = ["_rate", "_capacity", "_tokens", "_updated"]
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self._rate: float = rate
+        self._capacity: int = max(capacity, 1)
+        self._tokens: float = float(self._capacity)
+        self._updated: float = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """
+        Returns how many seconds remain until a token is available.
+        """
+        self._refill()
+
+        return max(1 - self._tokens, 0) / self._rate
+
+    def consume(self) -> None:
+        self._refill()
+        self._tokens -= 1
+
+    def penalize(self, delay: float) -> None:
+        """
+        Empties the bucket and pushes the next refill back by delay seconds.
+        """
+        self._tokens = 0
+        self._updated = time.monotonic() + delay
+
+
+class KeyPool:
+    """
+    Spreads requests across api keys, each limited by its own token bucket.
+    Waiting priority requests, such as those made by commands, are always handed a key before background requests.
+    """
+
+    __slots__: typing.List[str] = ["_buckets", "_waiters", "_task"]
+
+    def __init__(self) -> None:
+        self._buckets: typing.Dict[str, TokenBucket] = {}
+        self._waiters: typing.Tuple[collections.deque, collections.deque] = (collections.deque(), collections.deque())
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def configure(self, keys: typing.Iterable[str], rate: float, capacity: int) -> None:
+        if rate <= 0:
+            raise ValueError(f"the politics and war request rate must be positive, not {rate}!")
+
+        self._buckets = {key: TokenBucket(rate, capacity) for key in keys}
+
+    async def _dispatch(self) -> None:
+        """
+        Serves waiters until none are left. If serving fails, every pending waiter is failed with the same error.
+        """
+        try:
+            await self._serve()
+
+        except Exception as exc:
+            for waiters in self._waiters:
+                while waiters:
+                    waiter = waiters.popleft()
+
+                    if not waiter.done():
+                        waiter.set_exception(exc)
+
+    async def _serve(self) -> None:
+        """
+        Hands the key with the soonest available token to the next waiter, priority waiters first.
+        """
+        while any(self._waiters):
+            if not self._buckets:
+                raise NoKeysConfigured("no politics and war api keys have been configured!")
+
+            key, bucket = min(self._buckets.items(), key=lambda item: item[1].wait_time())
+            delay = bucket.wait_time()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            waiters = self._waiters[0] or self._waiters[1]
+            waiter = waiters.popleft()
+
+            if not waiter.done():
+                bucket.consume()
+                waiter.set_result(key)
+
+    async def acquire(self, priority: bool = False) -> str:
+        """
+        Waits for a token on any key and returns that key.
+        """
+        if not self._buckets:
+            raise NoKeysConfigured("no politics and war api keys have been configured!")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[0 if priority else 1].append(waiter)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+
+        return await waiter
+
+    def penalize(self, key: str, delay: float) -> None:
+        bucket = self._buckets.get(key)
+
+        if bucket is not None:
+            bucket.penalize(delay)
+
+    def stop(self) -> None:
+        """
+        Stops handing out keys and cancels any waiting requests.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for waiters in self._waiters:
+            while waiters:
+                waiters.popleft().cancel()
+
+
+def _raise_for_errors(data: typing.Any) -> None:
+    if isinstance(data, list):
+        data = data[0]
+
+    if not isinstance(data, dict):
+        raise exceptions.UnexpectedResponse(str(data))
+
+    if "errors" in data:
+        message = data["errors"][0]["message"]
+
+        if "invalid api_key" in message:
+            raise exceptions.InvalidToken(message)
+
+        if "Syntax Error" in message:
+            raise exceptions.InvalidQuery(message)
+
+        raise exceptions.UnexpectedResponse(message)
+
+    if "data" not in data:
+        raise exceptions.UnexpectedResponse(str(data))
+
+
+class RowDecoder:
+    """
+    Incrementally decodes the rows of aliased paginated responses as chunks of the body arrive.
+    Only the row being decoded is held in memory, no matter how many pages a response contains.
+    Everything outside the rows is kept as a skeleton of the response, which close checks for errors and missing pages.
+    """
+
+    __slots__: typing.List[str] = ["_buffer", "_alias", "_text", "_json", "_skeleton", "aliases", "seen"]
+
+    def __init__(self, aliases: typing.Iterable[str]) -> None:
+        self._buffer: str = ""
+        self._alias: typing.Optional[str] = None
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json: json.JSONDecoder = json.JSONDecoder()
+        self._skeleton: typing.List[str] = []
+        self.aliases: typing.FrozenSet[str] = frozenset(aliases)
+        self.seen: typing.Set[str] = set()
+
+    @property
+    def pages(self) -> int:
+        return len(self.seen)
+
+    def feed(self, chunk: bytes) -> typing.Iterator[typing.Tuple[str, dict]]:
+        """
+        Yields an alias and row for every row completed by chunk.
+        """
+        buffer = self._buffer + self._text.decode(chunk)
+        position = 0
+
+        while True:
+            if self._alias is None:
+                match = _PAGE_START.search(buffer, position)
+
+                if match is None:
+                    break
+
+                self._alias = match.group(1)
+                self.seen.add(self._alias)
+                self._skeleton.append(buffer[position:match.end()])
+                position = match.end()
+
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position >= len(buffer):
+                break
+
+            if buffer[position] == "]":
+                self._skeleton.append("]")
+                self._alias = None
+                position += 1
+                continue
+
+            if buffer[position] != "{":
+                raise exceptions.UnexpectedResponse(f"unexpected {buffer[position]!r} in page {self._alias}!")
+
+            try:
+                row, position = self._json.raw_decode(buffer, position)
+
+            except json.JSONDecodeError:
+                if len(buffer) - position > _MAX_ROW:
+                    raise exceptions.UnexpectedResponse(f"malformed row in page {self._alias}!") from None
+
+                break
+
+            yield self._alias, row
+
+        self._buffer = buffer[position:]
+
+    def close(self) -> None:
+        """
+        Raises for any errors the api returned alongside or in place of pages, and for requested pages it left out.
+        """
+        if self._alias is not None:
+            raise exceptions.UnexpectedResponse(f"the response ended inside page {self._alias}!")
+
+        try:
+            data = json.loads("".join(self._skeleton) + self._buffer + self._text.decode(b"", final=True))
+
+        except json.JSONDecodeError as exc:
+            raise exceptions.UnexpectedResponse(f"malformed response: {exc}") from None
+
+        _raise_for_errors(data)
+        pages = data["data"] if isinstance(data, dict) and isinstance(data["data"], dict) else {}
+        missing = sorted(
+            alias for alias in self.aliases if alias not in self.seen or not isinstance(pages.get(alias), dict)
+        )
+
+        if missing:
+            raise exceptions.UnexpectedResponse(f"the response is missing page(s) {', '.join(missing)}!")
+
+
+async def _post_query(session: aiohttp.ClientSession, api_key: str, query: str) -> dict:
+    async with session.post(API_URL, params={"api_key": api_key}, json={"query": "{" + query + "}"}) as response:
+        if response.status == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise RateLimited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+        response.raise_for_status()
+        data = await response.json()
+
+    _raise_for_errors(data)
+
+    return data["data"]
+
+
+async def _open_query(session: aiohttp.ClientSession, api_key: str, query: str) -> aiohttp.ClientResponse:
+    response = await session.post(API_URL, params={"api_key": api_key}, json={"query": "{" + query + "}"})
+
+    if response.status == 429:
+        retry_after = response.headers.get("Retry-After")
+        response.release()
+        raise RateLimited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    if not response.ok:
+        response.release()
+        response.raise_for_status()
+
+    return response
+
+
+async def _retry(
+    call: typing.Callable[[str], typing.Awaitable[T]],
+    pool: KeyPool,
+    priority: bool,
+    retries: int,
+    backoff: float,
+) -> T:
+    """
+    Retries rate limits and transient failures. A rate limited key is benched for the delay the api asked for
+    and the retry moves to another key, transient failures back off exponentially with jitter.
+    """
+    attempt = 0
+
+    while True:
+        key = await pool.acquire(priority)
+        delay = 0.0
+
+        try:
+            return await call(key)
+
+        except RateLimited as exc:
+            pool.penalize(key, exc.retry_after or backoff * 2 ** attempt)
+            error = exc
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            delay = backoff * 2 ** attempt + random.uniform(0, backoff)
+            error = exc
+
+        if attempt >= retries:
+            raise error
+
+        attempt += 1
+
+        _LOGGER.debug("retrying politics and war query in %.2f seconds! (%s)", delay, error)
+
+        await asyncio.sleep(delay)
+
+
+async def fetch_query(
+    session: aiohttp.ClientSession,
+    pool: KeyPool,
+    query: str,
+    *,
+    priority: bool = False,
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> dict:
+    """
+    Fetches a query from the gql api using the next available key from pool.
+    Pass priority for requests a user is waiting on so they skip ahead of background requests.
+    """
+    return await _retry(lambda key: _post_query(session, key, query), pool, priority, retries, backoff)
+
+
+async def stream_query(
+    session: aiohttp.ClientSession,
+    pool: KeyPool,
+    query: str,
+    aliases: typing.Iterable[str],
+    *,
+    priority: bool = False,
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> typing.AsyncIterator[typing.Tuple[str, dict]]:
+    """
+    Fetches a query of aliased page queries from the gql api, yielding each alias and row as it is decoded.
+    Failures before the response starts are retried like fetch_query, failures mid stream are raised.
+    Errors in the response or any of aliases missing from it raise once the body has been read.
+    """
+    response = await _retry(lambda key: _open_query(session, key, query), pool, priority, retries, backoff)
+    decoder = RowDecoder(aliases)
+
+    try:
+        async for chunk in response.content.iter_any():
+            for row in decoder.feed(chunk):
+                yield row
+
+    finally:
+        response.release()
+
+    decoder.close()
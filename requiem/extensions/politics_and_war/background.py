@@ -15,52 +15,410 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+
+from extensions.politics_and_war import api, query
 from lightbulb.ext import tasks
-from pwpy import api
 
+import asyncio
+import collections
+import logging
+import random
+import typing
+import time
+import aiohttp
+import attr
+
+
+_LOGGER = logging.getLogger("requiem.politics_and_war")
+PageHandler = typing.Callable[[str, list], typing.Awaitable[None]]
+PAGE_SIZES = {
+    "nations": 500,
+    "alliances": 50,
+}
+FIELDS: typing.Dict[str, query.Fields] = {
+    "nations": (
+        "nation_name",
+        "leader_name",
+        "id",
+        "date",
+        "score",
+        "alliance_id",
+        "num_cities",
+        "color",
+        "vacation_mode_turns",
+        "beige_turns",
+    ),
+    "alliances": (
+        "name",
+        "id",
+        "acronym",
+        "date",
+    ),
+}
+RECONCILE_FIELDS: typing.Dict[str, query.Fields] = {
+    "nations": (*FIELDS["nations"], ("cities", ("infrastructure",), 30)),
+    "alliances": FIELDS["alliances"],
+}
+WAR_STATE_FIELDS: query.Fields = (
+    "id",
+    "score",
+    "alliance_id",
+    "num_cities",
+    "color",
+    "vacation_mode_turns",
+    "beige_turns",
+)
+
+
+@attr.s(auto_attribs=True)
+class SyncState:
+    """
+    Tracks the highest nation and alliance ids seen and when the last full reconciliation and war state refresh ran.
+    """
+    high_water: dict = attr.Factory(lambda: {"nations": 0, "alliances": 0})
+    last_reconciled: float = 0.0
+    last_refreshed: float = 0.0
+
+    def observe(self, kind: str, rows: list) -> None:
+        if rows:
+            self.high_water[kind] = max(self.high_water[kind], *(int(row["id"]) for row in rows))
+
+    def reconcile_due(self, interval: float) -> bool:
+        return not self.last_reconciled or time.time() - self.last_reconciled >= interval
+
+    def refresh_due(self, interval: float) -> bool:
+        return time.time() - max(self.last_reconciled, self.last_refreshed) >= interval
+
+
+async def _last_pages(
+    session: aiohttp.ClientSession,
+    pool: api.KeyPool,
+    kinds: typing.Iterable[str],
+) -> typing.Dict[str, int]:
+    page_counts = " ".join(
+        f"{kind}(first: {PAGE_SIZES[kind]}) {{ paginatorInfo {{ lastPage }} }}" for kind in kinds
+    )
+    response = await api.fetch_query(session, pool, page_counts)
+
+    return {kind: response[kind]["paginatorInfo"]["lastPage"] for kind in response}
+
+
+@attr.s(auto_attribs=True)
+class SyncRun:
+    """
+    Metrics for a single scheduled sync. Rows counts every nation and alliance row passed to the page handler.
+    """
+    started_at: float
+    full: bool = False
+    duration: float = 0.0
+    pages: int = 0
+    rows: int = 0
+    failed: bool = False
+
+
+class SyncTrigger(tasks.triggers.Trigger):
+    """
+    Waits interval seconds plus up to jitter seconds between syncs.
+    After a failed sync the wait is replaced by an exponential backoff starting at backoff and capped at max_backoff.
+    """
+
+    __slots__: typing.List[str] = ["interval", "jitter", "backoff", "max_backoff", "failures"]
+
+    def __init__(
+        self,
+        interval: float = 900.0,
+        jitter: float = 60.0,
+        backoff: float = 60.0,
+        max_backoff: float = 3600.0,
+    ) -> None:
+        self.interval: float = interval
+        self.jitter: float = jitter
+        self.backoff: float = backoff
+        self.max_backoff: float = max_backoff
+        self.failures: int = 0
+
+    @property
+    def delay(self) -> float:
+        if self.failures:
+            return min(self.backoff * 2 ** (self.failures - 1), self.max_backoff)
 
-async def generate_identity_queries(api_key: str, query_handler: api.BulkQueryHandler) -> None:
+        return self.interval
+
+    def get_interval(self) -> float:
+        return self.delay + random.uniform(0, max(self.jitter, 0))
+
+
+class SyncScheduler:
+    """
+    Runs syncs one at a time, feeding failures back into the trigger and keeping metrics for the most recent runs.
+    A sync requested while another is still in flight is skipped rather than queued.
+    """
+
+    __slots__: typing.List[str] = ["trigger", "runs", "_lock"]
+
+    def __init__(self, trigger: SyncTrigger, history: int = 50) -> None:
+        self.trigger: SyncTrigger = trigger
+        self.runs: typing.Deque[SyncRun] = collections.deque(maxlen=history)
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def run(self, sync: typing.Callable[[SyncRun], typing.Awaitable[None]]) -> typing.Optional[SyncRun]:
+        """
+        Calls sync with a fresh SyncRun to fill in. Errors are logged and counted instead of raised,
+        so the task keeps running and backs off. Returns None if a sync was already running.
+        """
+        if self._lock.locked():
+            _LOGGER.warning("requiem skipped an identity sync because the previous one is still running!")
+            return None
+
+        async with self._lock:
+            run = SyncRun(time.time())
+            started = time.perf_counter()
+
+            try:
+                await sync(run)
+
+            except Exception as exc:
+                run.failed = True
+                self.trigger.failures += 1
+
+                _LOGGER.error(
+                    "requiem failed to sync identities %s time(s) in a row! retrying in about %ss!",
+                    self.trigger.failures,
+                    round(self.trigger.delay),
+                    exc_info=exc,
+                )
+
+            else:
+                self.trigger.failures = 0
+
+            finally:
+                run.duration = time.perf_counter() - started
+                self.runs.append(run)
+
+            if not run.failed:
+                _LOGGER.info(
+                    "requiem finished a%s identity sync in %.2fs with %s page(s) and %s row(s)!",
+                    " full" if run.full else "n incremental",
+                    run.duration,
+                    run.pages,
+                    run.rows,
+                )
+
+            return run
+
+
+async def generate_identity_queries(
+    session: aiohttp.ClientSession,
+    pool: api.KeyPool,
+) -> typing.List[query.PageQuery]:
     """
     Fetches page count for nations and alliances.
     Generates subsequent queries for identifying data.
     """
-    query = """
-    nations(first: 500) {
-        paginatorInfo {
-            lastPage
-        }
-    }
-    alliances(first: 50) {
-        paginatorInfo {
-            lastPage
-        }
-    }
-    """
-    response = await api.fetch_query(api_key, query)
-
-    nations_pages = response["nations"]["paginatorInfo"]["lastPage"]
-    for page_number in range(nations_pages):
-        query = """
-        NATIONS_{0}: nations(first: 500, page: {0}) {{
-            data {{
-                nation_name
-                leader_name
-                id
-                date
-            }}
-        }}
-        """.format(str(page_number + 1))
-        query_handler.add_query(query)
-
-    alliances_pages = response["alliances"]["paginatorInfo"]["lastPage"]
-    for page_number in range(alliances_pages):
-        query = """
-        ALLIANCES_{0}: alliances(first: 50, page: {0}) {{
-            data {{
-                name
-                id
-                acronym
-            }}
-        }}
-        """.format(str(page_number + 1))
-        query_handler.add_query(query)
\ No newline at end of file
+    last_pages = await _last_pages(session, pool, ("nations", "alliances"))
+
+    return [
+        query.page_query(kind, page_number + 1, PAGE_SIZES[kind], RECONCILE_FIELDS[kind])
+        for kind in ("nations", "alliances")
+        for page_number in range(last_pages[kind])
+    ]
+
+
+def _delta_query(kind: str, page: int) -> query.PageQuery:
+    return query.page_query(
+        kind,
+        page,
+        PAGE_SIZES[kind],
+        FIELDS[kind],
+        orderBy={"column": query.Enum("ID"), "order": query.Enum("DESC")},
+    )
+
+
+async def _stream_pages(
+    session: aiohttp.ClientSession,
+    pool: api.KeyPool,
+    queries: typing.List[query.PageQuery],
+    handler: PageHandler,
+    *,
+    concurrency: int,
+    budget: int,
+    chunk_size: int,
+) -> int:
+    """
+    Fetches pages with up to concurrency requests in flight, packed into batches of up to budget estimated cost.
+    Responses are decoded as they stream in and passed to handler in chunks of up to chunk_size rows.
+    Returns the number of requests made.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def emit(kind: str, rows: list) -> None:
+        if rows:
+            await handler(kind, rows)
+
+    async def fetch_batch(batch: typing.List[query.PageQuery]) -> None:
+        kinds = {page.alias: page.kind for page in batch}
+        kind, rows = None, []
+
+        async with semaphore:
+            stream = api.stream_query(session, pool, query.render_batch(batch), kinds)
+
+            async for alias, row in stream:
+                if kinds[alias] != kind or len(rows) >= chunk_size:
+                    await emit(kind, rows)
+                    kind, rows = kinds[alias], []
+
+                rows.append(row)
+
+            await emit(kind, rows)
+
+    tasks = [asyncio.create_task(fetch_batch(batch)) for batch in query.pack(queries, budget)]
+
+    try:
+        await asyncio.gather(*tasks)
+
+    except Exception:
+        for task in tasks:
+            task.cancel()
+
+        raise
+
+    return len(tasks)
+
+
+async def reconcile_identities(
+    session: aiohttp.ClientSession,
+    pool: api.KeyPool,
+    handler: PageHandler,
+    state: SyncState,
+    *,
+    concurrency: int = 4,
+    budget: int = 100000,
+    chunk_size: int = 100,
+) -> int:
+    """
+    Fetches every identity page with up to concurrency requests in flight.
+    Pages are packed into aliased batches of up to budget estimated cost per request.
+    Responses are decoded as they stream in and passed to handler in chunks of up to chunk_size rows.
+    Returns the number of pages fetched.
+    """
+    queries = await generate_identity_queries(session, pool)
+
+    async def observe(kind: str, rows: list) -> None:
+        state.observe(kind, rows)
+        await handler(kind, rows)
+
+    requests = await _stream_pages(
+        session, pool, queries, observe, concurrency=concurrency, budget=budget, chunk_size=chunk_size
+    )
+
+    state.last_reconciled = time.time()
+
+    _LOGGER.info(
+        "requiem has reconciled %s page(s) of nations and alliances in %s request(s)!", len(queries), requests
+    )
+
+    return len(queries)
+
+
+async def refresh_war_state(
+    session: aiohttp.ClientSession,
+    pool: api.KeyPool,
+    handler: PageHandler,
+    state: SyncState,
+    *,
+    concurrency: int = 4,
+    budget: int = 100000,
+    chunk_size: int = 500,
+) -> int:
+    """
+    Fetches only the war state fields of every nation, which go stale far sooner than names and founding dates.
+    Responses are decoded as they stream in and passed to handler in chunks of up to chunk_size rows.
+    Returns the number of pages fetched.
+    """
+    last_pages = await _last_pages(session, pool, ("nations",))
+    queries = [
+        query.page_query("nations", page_number + 1, PAGE_SIZES["nations"], WAR_STATE_FIELDS)
+        for page_number in range(last_pages["nations"])
+    ]
+    requests = await _stream_pages(
+        session, pool, queries, handler, concurrency=concurrency, budget=budget, chunk_size=chunk_size
+    )
+
+    state.last_refreshed = time.time()
+
+    _LOGGER.info(
+        "requiem has refreshed the war state of %s page(s) of nations in %s request(s)!", len(queries), requests
+    )
+
+    return len(queries)
+
+
+async def sync_identity_deltas(
+    session: aiohttp.ClientSession,
+    pool: api.KeyPool,
+    handler: PageHandler,
+    state: SyncState,
+) -> int:
+    """
+    Fetches nations and alliances created since the last high water mark, newest first.
+    Paging stops at the first page reaching an id that has already been seen. Returns the number of pages fetched.
+    """
+
+    async def fetch_kind(kind: str) -> int:
+        mark = state.high_water[kind]
+        page = 0
+
+        while True:
+            page += 1
+            page_query = _delta_query(kind, page)
+            response = await api.fetch_query(session, pool, page_query.render())
+            rows = response[page_query.alias]["data"]
+            fresh = [row for row in rows if int(row["id"]) > mark]
+
+            if fresh:
+                state.observe(kind, fresh)
+                await handler(kind, fresh)
+
+            if len(fresh) < len(rows) or not rows:
+                return page
+
+    nations_pages, alliances_pages = await asyncio.gather(fetch_kind("nations"), fetch_kind("alliances"))
+
+    return nations_pages + alliances_pages
+
+
+async def sync_identities(
+    session: aiohttp.ClientSession,
+    pool: api.KeyPool,
+    handler: PageHandler,
+    state: SyncState,
+    *,
+    reconcile_interval: float = 86400,
+    refresh: typing.Optional[PageHandler] = None,
+    refresh_interval: float = 3600,
+    concurrency: int = 4,
+    budget: int = 100000,
+) -> int:
+    """
+    Runs a full reconciliation when one is due, otherwise only fetches deltas since the last high water mark.
+    Between reconciliations the war state of every nation is passed to refresh once every refresh_interval seconds.
+    """
+    if state.reconcile_due(reconcile_interval):
+        return await reconcile_identities(
+            session, pool, handler, state, concurrency=concurrency, budget=budget
+        )
+
+    pages = await sync_identity_deltas(session, pool, handler, state)
+
+    _LOGGER.info("requiem has synced %s page(s) of new nations and alliances!", pages)
+
+    if refresh is not None and state.refresh_due(refresh_interval):
+        pages += await refresh_war_state(
+            session, pool, refresh, state, concurrency=concurrency, budget=budget
+        )
+
+    return pages
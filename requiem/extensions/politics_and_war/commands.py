@@ -15,11 +15,31 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+from extensions.politics_and_war import api, stats, sync
+from extensions.politics_and_war import infra as infra_curve
+from requiem.lib import models
+from lib.utils import extra
+from lib import client
+
+import asyncio
+import datetime
+import json
+import time
+import typing
+import aiohttp
 import hikari
 import lightbulb
+import tortoise
 import pwpy
 
 
+city_cache = extra.TTLCache(120.0)
+
+
+def load(bot: client.Requiem) -> None:
+    city_cache.ttl = bot.config.pnw_city_cache_ttl
+
+
 def add_discount_fields(cost: float, embed: hikari.Embed) -> None:
     embed.add_field(name="Base", value=f"${cost:,.2f}")
 
@@ -29,64 +49,270 @@ def add_discount_fields(cost: float, embed: hikari.Embed) -> None:
         embed.add_field(name="15% Off", value=f"${cost * .85:,.2f}")
 
 
-@lightbulb.command("infra", "Calculate the cost of buying or selling infra.")
-@lightbulb.implements(lightbulb.SlashCommandGroup)
-async def infra(ctx: lightbulb.Context) -> None:
-    pass
-
-
-@lightbulb.option(
-    name="nation",
-    description="The nation to calculate infra costs for.",
-    type=str,
-    required=True,
-)
-@lightbulb.option(
-    name="target",
-    description="The target infra amount.",
-    type=float,
-    required=True,
-    min_value=.01
-)
-@infra.child()
-@lightbulb.command("auto", "Automatically calculate the costs for a given nation or city.")
-@lightbulb.implements(lightbulb.SlashSubCommand)
+def add_list_field(name: str, lines: typing.List[str], embed: hikari.Embed) -> None:
+    shown = []
+    length = 0
+
+    for line in lines:
+        length += len(line) + 1
+
+        if length > 1000:
+            shown.append(f"and {len(lines) - len(shown)} more...")
+            break
+
+        shown.append(line)
+
+    if shown:
+        embed.add_field(name=name, value="\n".join(shown))
+
+
+async def resolve_nation(value: str) -> str:
+    """
+    Resolves a nation name, id or link to a query filter. Known names are looked up in the synced identity tables.
+    """
+    value = value.strip().rstrip("/")
+    tail = value.rsplit("=", 1)[-1]
+
+    if tail.isdigit():
+        return f"id: {tail}"
+
+    try:
+        nation = await models.Nations.filter(name_lower=value.lower()).first()
+
+    except tortoise.exceptions.BaseORMException:
+        nation = None
+
+    if nation is not None:
+        return f"id: {nation.id}"
+
+    return f"nation_name: {json.dumps(value)}"
+
+
+async def fetch_nation_cities(session: aiohttp.ClientSession, value: str) -> typing.Optional[dict]:
+    """
+    Fetches a nation and the infra of each of its cities in one query. Results are cached for a short time.
+    """
+    nation_filter = await resolve_nation(value)
+    nation = city_cache.get(nation_filter)
+
+    if nation is not None:
+        return nation
+
+    query = f"""
+    nations(first: 1, {nation_filter}) {{
+        data {{
+            id
+            nation_name
+            cities {{
+                id
+                name
+                infrastructure
+            }}
+        }}
+    }}
+    """
+    response = await api.fetch_query(session, sync.key_pool, query, priority=True)
+    data = response["nations"]["data"]
+
+    if not data:
+        return None
+
+    nation = data[0]
+    city_cache.put(nation_filter, nation)
+
+    return nation
+
+
 async def infra_auto(ctx: lightbulb.Context) -> None:
-    await ctx.respond("This command is not ready yet!")
-
-
-@lightbulb.option(
-    name="starting",
-    description="The starting infra amount.",
-    type=float,
-    required=True,
-    min_value=.01
-)
-@lightbulb.option(
-    name="target",
-    description="The target infra amount.",
-    type=float,
-    required=True,
-    min_value=.01
-)
-@lightbulb.option(
-    name="cities",
-    description="The number of cities to multiply th cost by.",
-    type=int,
-    min_value=1
-)
-@infra.child()
-@lightbulb.command("manual", "Calculate the cost of buying or selling infra.")
-@lightbulb.implements(lightbulb.SlashSubCommand)
+    target = ctx.options.target
+
+    if not sync.key_pool:
+        await ctx.respond("This command requires a Politics and War API key to be configured!")
+        return
+
+    await ctx.respond(hikari.ResponseType.DEFERRED_MESSAGE_CREATE)
+
+    nation = await fetch_nation_cities(ctx.bot.session, ctx.options.nation)
+
+    if nation is None:
+        await ctx.respond("Requiem was unable to find that nation!")
+        return
+
+    sync.identities.nations.record(ctx.author.id, nation["nation_name"])
+
+    cities = nation["cities"]
+    costs = infra_curve.curve.costs((float(city["infrastructure"]), target) for city in cities)
+    cost = sum(costs)
+    city_str = "cities" if len(cities) > 1 else "city"
+    embed = hikari.Embed(
+        title="Infra Cost Calculator",
+        description=f"The cost to bring {nation['nation_name']}'s {len(cities)} {city_str} to {target:,.2f} "
+                    f"are as follows"
+    )
+    add_discount_fields(cost, embed)
+    add_list_field(
+        "Cities",
+        [
+            f"{city['name']}: {float(city['infrastructure']):,.2f} infra, ${city_cost:,.2f}"
+            for city, city_cost in zip(cities, costs)
+        ],
+        embed,
+    )
+    await ctx.respond(embed=embed)
+
+
 async def infra_manual(ctx: lightbulb.Context) -> None:
     starting = ctx.options.starting
     target = ctx.options.target
     cities = ctx.options.cities
     city_str = "cities" if cities > 1 else "city"
-    cost = pwpy.utils.infra_cost(starting, target) * cities
+    cost = infra_curve.curve.cost(starting, target) * cities
     embed = hikari.Embed(
         title="Infra Cost Calculator",
         description=f"The cost to go from {starting:,.2f} to {target:,.2f} for {cities} {city_str} are as follows"
     )
     add_discount_fields(cost, embed)
     await ctx.respond(embed=embed)
+
+
+async def infra_plan(ctx: lightbulb.Context) -> None:
+    budget = ctx.options.budget
+
+    if not sync.key_pool:
+        await ctx.respond("This command requires a Politics and War API key to be configured!")
+        return
+
+    await ctx.respond(hikari.ResponseType.DEFERRED_MESSAGE_CREATE)
+
+    nation = await fetch_nation_cities(ctx.bot.session, ctx.options.nation)
+
+    if nation is None:
+        await ctx.respond("Requiem was unable to find that nation!")
+        return
+
+    sync.identities.nations.record(ctx.author.id, nation["nation_name"])
+
+    cities = nation["cities"]
+    starting = [float(city["infrastructure"]) for city in cities]
+    targets = infra_curve.curve.plan(starting, budget, ctx.options.limit)
+    costs = infra_curve.curve.costs(zip(starting, targets))
+    cost = sum(costs)
+    embed = hikari.Embed(
+        title="Infra Purchase Planner",
+        description=f"The best way to spend ${budget:,.2f} across {nation['nation_name']}'s cities buys "
+                    f"{sum(targets) - sum(starting):,.2f} infra and costs as follows"
+    )
+    add_discount_fields(cost, embed)
+    add_list_field(
+        "Cities",
+        [
+            f"{city['name']}: {start:,.2f} to {target:,.2f} infra, ${city_cost:,.2f}"
+            for city, start, target, city_cost in zip(cities, starting, targets, costs)
+            if target > start
+        ],
+        embed,
+    )
+    await ctx.respond(embed=embed)
+
+
+async def targets(ctx: lightbulb.Context) -> None:
+    found = sync.identities.targets.lookup(ctx.options.nation)
+
+    if found is None:
+        await ctx.respond("Requiem was unable to find that nation! It may not have been synced yet.")
+        return
+
+    nation_id, nation = found
+    sync.identities.nations.record(ctx.author.id, nation.name)
+
+    min_score, max_score = pwpy.utils.score_range(nation.score)
+    matches = sync.identities.targets.within_range(nation.score, exclude=nation_id)
+    embed = hikari.Embed(
+        title="War Range Targets",
+        description=f"Unaligned nations outside of beige and vacation mode between {min_score:,.2f} and "
+                    f"{max_score:,.2f} score"
+    )
+    lines = [
+        f"[{target.name}](https://politicsandwar.com/nation/id={target_id}): "
+        f"{target.score:,.2f} score, {target.cities} cities"
+        for target_id, target in matches
+    ]
+    add_list_field("Targets", lines or ["No targets found!"], embed)
+    age = datetime.timedelta(seconds=round(time.time() - sync.identities.targets.updated_at))
+    embed.set_footer(text=f"War state last synced {age} ago")
+    await ctx.respond(embed=embed)
+
+
+async def alliance_stats(ctx: lightbulb.Context) -> None:
+    aggregate = sync.identities.stats.lookup(ctx.options.alliance)
+
+    if aggregate is None:
+        await ctx.respond("Requiem was unable to find that alliance! It may not have been synced yet.")
+        return
+
+    sync.identities.alliances.record(ctx.author.id, aggregate.name)
+
+    embed = hikari.Embed(
+        title=aggregate.name,
+        url=f"https://politicsandwar.com/alliance/id={aggregate.id}",
+    )
+    embed.add_field(name="Members", value=f"{aggregate.members:,}", inline=True)
+    embed.add_field(name="Score", value=f"{aggregate.score:,.2f}", inline=True)
+    embed.add_field(name="Average Score", value=f"{aggregate.score / aggregate.members:,.2f}", inline=True)
+    embed.add_field(
+        name="Cities",
+        value=f"{aggregate.min_cities} to {aggregate.max_cities}, {aggregate.average_cities:,.2f} average",
+        inline=True,
+    )
+    embed.add_field(name="Average Infra", value=f"{aggregate.average_infra:,.2f} per city", inline=True)
+
+    tiers = stats.CITY_TIERS
+    lines = [
+        f"{low}-{high - 1} cities: {count}" if high else f"{low}+ cities: {count}"
+        for low, high, count in zip(tiers, tiers[1:] + (None,), aggregate.tiers)
+        if count
+    ]
+    add_list_field("Members By City Count", lines, embed)
+    await ctx.respond(embed=embed)
+
+
+async def alliance_leaderboard(ctx: lightbulb.Context) -> None:
+    embed = hikari.Embed(title="Alliance Leaderboard")
+    lines = [
+        f"{position}. [{aggregate.name}](https://politicsandwar.com/alliance/id={aggregate.id}): "
+        f"{aggregate.score:,.2f} score, {aggregate.members} members"
+        for position, aggregate in enumerate(sync.identities.stats.leaderboard(), 1)
+    ]
+    add_list_field("Alliances", lines or ["No alliances have been synced yet!"], embed)
+    await ctx.respond(embed=embed)
+
+
+async def growth(ctx: lightbulb.Context) -> None:
+    found = sync.identities.targets.lookup(ctx.options.nation)
+    nation_history = sync.identities.history
+
+    if found is None or nation_history is None:
+        await ctx.respond("Requiem was unable to find that nation! It may not have been synced yet.")
+        return
+
+    nation_id, nation = found
+    sync.identities.nations.record(ctx.author.id, nation.name)
+
+    loop = asyncio.get_running_loop()
+    change = await loop.run_in_executor(None, nation_history.growth, nation_id, ctx.options.days)
+
+    if change is None:
+        await ctx.respond("Requiem has not recorded any history for that nation yet!")
+        return
+
+    since = datetime.datetime.fromtimestamp(change.since).strftime("%A %B %d, %Y")
+    embed = hikari.Embed(
+        title=f"{nation.name}'s Growth",
+        description=f"Changes since {since} are as follows",
+        url=f"https://politicsandwar.com/nation/id={nation_id}",
+    )
+    embed.add_field(name="Score", value=f"{change.score:+,.2f}", inline=True)
+    embed.add_field(name="Cities", value=f"{change.cities:+,}", inline=True)
+    embed.add_field(name="Infra", value=f"{change.infra:+,.2f}", inline=True)
+    await ctx.respond(embed=embed)
+
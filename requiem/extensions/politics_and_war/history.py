@@ -0,0 +1,376 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import array
+import bisect
+import collections
+import logging
+import os
+import pathlib
+import struct
+import sys
+import threading
+import time
+import typing
+import zlib
+
+
+_LOGGER = logging.getLogger("requiem.politics_and_war")
+_HEADER = struct.Struct("<4sHdI?I")
+_BLOCK = struct.Struct("<qQI")
+_MAGIC = b"RQNH"
+_VERSION = 2
+_COLUMNS = 4
+
+
+class Growth(typing.NamedTuple):
+    since: float
+    score: float
+    cities: int
+    infra: float
+
+
+def _pack(values: typing.Iterable[int]) -> bytes:
+    column = array.array("q", values)
+
+    if sys.byteorder != "little":
+        column.byteswap()
+
+    return column.tobytes()
+
+
+def _unpack(data: bytes) -> array.array:
+    column = array.array("q")
+    column.frombytes(data)
+
+    if sys.byteorder != "little":
+        column.byteswap()
+
+    return column
+
+
+def _differences(values: typing.Sequence[int]) -> typing.Iterator[int]:
+    previous = 0
+
+    for value in values:
+        yield value - previous
+        previous = value
+
+
+def _running_sum(values: typing.Iterable[int]) -> typing.Iterator[int]:
+    total = 0
+
+    for value in values:
+        total += value
+        yield total
+
+
+class _Generation(typing.NamedTuple):
+    """
+    The header and block index of a generation file. The blocks themselves are only read when needed.
+    """
+
+    timestamp: float
+    keyframe: bool
+    first_ids: array.array
+    offsets: array.array
+    lengths: array.array
+
+
+class _Block(typing.NamedTuple):
+    ids: array.array
+    columns: typing.Tuple[array.array, ...]
+
+    def find(self, nation: int) -> typing.Optional[typing.Tuple[int, ...]]:
+        position = bisect.bisect_left(self.ids, nation)
+
+        if position < len(self.ids) and self.ids[position] == nation:
+            return tuple(column[position] for column in self.columns)
+
+        return None
+
+
+def _read_index(path: pathlib.Path) -> _Generation:
+    with open(path, "rb") as stream:
+        magic, version, stamp, _, keyframe, blocks = _HEADER.unpack(stream.read(_HEADER.size))
+
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("unsupported nation history generation!")
+
+        index = stream.read(_BLOCK.size * blocks)
+
+    first_ids, offsets, lengths = array.array("q"), array.array("Q"), array.array("I")
+
+    for first_id, offset, length in _BLOCK.iter_unpack(index):
+        first_ids.append(first_id)
+        offsets.append(offset)
+        lengths.append(length)
+
+    return _Generation(stamp, keyframe, first_ids, offsets, lengths)
+
+
+class NationHistory:
+    """
+    Stores score, city and infra history for every nation with one file per sync generation.
+
+    Every keyframe_interval generations a keyframe holds full values; the generations between hold each nation's
+    change since the previous generation. Those are mostly zero and compress to almost nothing. Each file is split
+    into blocks of block_size sorted ids, compressed separately and listed in an index by their first id, so a point
+    lookup bisects the index and decompresses a single block per generation of at most one keyframe chain.
+    Lookups and recording are blocking and meant to be run in an executor; a lock keeps them from interleaving.
+    """
+
+    __slots__: typing.List[str] = [
+        "_directory",
+        "_keyframe_interval",
+        "_retention",
+        "_block_size",
+        "_timestamps",
+        "_generations",
+        "_latest",
+        "_cache",
+        "_cache_size",
+        "_lock",
+    ]
+
+    def __init__(
+        self,
+        directory: pathlib.Path,
+        keyframe_interval: int = 24,
+        retention: float = 90 * 86400,
+        block_size: int = 1024,
+        cache: int = 256,
+    ) -> None:
+        self._directory: pathlib.Path = directory
+        self._keyframe_interval: int = keyframe_interval
+        self._retention: float = retention
+        self._block_size: int = block_size
+        self._timestamps: typing.List[float] = []
+        self._generations: typing.Dict[float, _Generation] = {}
+        self._latest: typing.Optional[typing.Dict[int, typing.Tuple[int, ...]]] = None
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+        self._cache_size: int = cache
+        self._lock: threading.Lock = threading.Lock()
+
+    def _path(self, timestamp: float) -> pathlib.Path:
+        return self._directory / f"{timestamp:.3f}.gen"
+
+    def scan(self) -> None:
+        """
+        Reads the index of each generation already on disk. Generations in an older format are ignored.
+        """
+        if not self._directory.is_dir():
+            return
+
+        for path in self._directory.glob("*.gen"):
+            try:
+                generation = _read_index(path)
+
+            except (OSError, ValueError, struct.error):
+                _LOGGER.warning("requiem was unable to read the nation history generation <%s>!", path.name)
+                continue
+
+            self._generations[generation.timestamp] = generation
+
+        self._timestamps = sorted(self._generations)
+
+    def _read_block(self, timestamp: float, number: int) -> _Block:
+        key = (timestamp, number)
+        block = self._cache.get(key)
+
+        if block is not None:
+            self._cache.move_to_end(key)
+            return block
+
+        generation = self._generations[timestamp]
+
+        with open(self._path(timestamp), "rb") as stream:
+            stream.seek(generation.offsets[number])
+            data = zlib.decompress(stream.read(generation.lengths[number]))
+
+        size = len(data) // _COLUMNS
+        columns = [_unpack(data[offset:offset + size]) for offset in range(0, len(data), size)]
+        ids = array.array("q", _running_sum(columns[0]))
+        block = _Block(ids, tuple(columns[1:]))
+        self._cache[key] = block
+
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return block
+
+    def _find(self, timestamp: float, nation: int) -> typing.Optional[typing.Tuple[int, ...]]:
+        number = bisect.bisect_right(self._generations[timestamp].first_ids, nation) - 1
+
+        if number < 0:
+            return None
+
+        return self._read_block(timestamp, number).find(nation)
+
+    def _rows(self, timestamp: float) -> typing.Iterator[typing.Tuple[int, typing.Tuple[int, ...]]]:
+        for number in range(len(self._generations[timestamp].first_ids)):
+            block = self._read_block(timestamp, number)
+
+            for row, nation in enumerate(block.ids):
+                yield nation, tuple(column[row] for column in block.columns)
+
+    def _keyframe_index(self, index: int) -> int:
+        while index > 0 and not self._generations[self._timestamps[index]].keyframe:
+            index -= 1
+
+        return index
+
+    def _materialize(self, index: int) -> typing.Dict[int, typing.Tuple[int, ...]]:
+        """
+        Rebuilds every nation's full values at a generation from its keyframe chain.
+        """
+        values: typing.Dict[int, typing.Tuple[int, ...]] = {}
+        empty = (0,) * (_COLUMNS - 1)
+
+        for position in range(self._keyframe_index(index), index + 1):
+            timestamp = self._timestamps[position]
+            previous = values if not self._generations[timestamp].keyframe else {}
+            values = {
+                nation: tuple(value + change for value, change in zip(previous.get(nation, empty), changes))
+                for nation, changes in self._rows(timestamp)
+            }
+
+        return values
+
+    def _value_at(self, index: int, nation: int) -> typing.Optional[typing.Tuple[int, ...]]:
+        """
+        Sums one nation's changes from the nearest keyframe up to a generation.
+        """
+        total: typing.Optional[typing.Tuple[int, ...]] = None
+
+        for position in range(self._keyframe_index(index), index + 1):
+            timestamp = self._timestamps[position]
+            found = self._find(timestamp, nation)
+
+            if found is None:
+                total = None
+
+            elif total is None or self._generations[timestamp].keyframe:
+                total = found
+
+            else:
+                total = tuple(value + change for value, change in zip(total, found))
+
+        return total
+
+    def record(self, nations: typing.Mapping[int, typing.Any], timestamp: typing.Optional[float] = None) -> None:
+        """
+        Writes a generation for a full nation snapshot.
+        """
+        with self._lock:
+            self._record(nations, round(timestamp or time.time(), 3))
+
+    def _record(self, nations: typing.Mapping[int, typing.Any], timestamp: float) -> None:
+        if self._latest is None and self._timestamps:
+            self._latest = self._materialize(len(self._timestamps) - 1)
+
+        current = {
+            nation_id: (round(nation.score * 100), nation.cities, round(nation.infra * 100))
+            for nation_id, nation in nations.items()
+        }
+        ids = sorted(current)
+        keyframe = len(self._timestamps) % self._keyframe_interval == 0
+        previous = {} if keyframe else (self._latest or {})
+        empty = (0,) * (_COLUMNS - 1)
+        blocks = []
+        first_ids, offsets, lengths = array.array("q"), array.array("Q"), array.array("I")
+
+        for start in range(0, len(ids), self._block_size):
+            block_ids = ids[start:start + self._block_size]
+            changes = [
+                tuple(value - base for value, base in zip(current[nation], previous.get(nation, empty)))
+                for nation in block_ids
+            ]
+            payload = [_pack(_differences(block_ids))]
+            payload.extend(_pack(change[column] for change in changes) for column in range(_COLUMNS - 1))
+            blocks.append(zlib.compress(b"".join(payload), 9))
+            first_ids.append(block_ids[0])
+
+        offset = _HEADER.size + _BLOCK.size * len(blocks)
+
+        for block in blocks:
+            offsets.append(offset)
+            lengths.append(len(block))
+            offset += len(block)
+
+        header = [_HEADER.pack(_MAGIC, _VERSION, timestamp, len(ids), keyframe, len(blocks))]
+        header.extend(_BLOCK.pack(*entry) for entry in zip(first_ids, offsets, lengths))
+
+        self._directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(timestamp)
+        temp = path.with_suffix(".tmp")
+        temp.write_bytes(b"".join(header + blocks))
+        os.replace(temp, path)
+
+        self._generations[timestamp] = _Generation(timestamp, keyframe, first_ids, offsets, lengths)
+        self._timestamps.append(timestamp)
+        self._latest = current
+        self._prune(timestamp)
+
+        _LOGGER.debug("requiem has recorded nation history for %s nation(s)!", len(ids))
+
+    def _prune(self, now: float) -> None:
+        """
+        Drops whole keyframe chains that ended before the retention window.
+        """
+        cutoff = now - self._retention
+        keep = 0
+
+        for index, timestamp in enumerate(self._timestamps):
+            if timestamp >= cutoff:
+                break
+
+            if self._generations[timestamp].keyframe:
+                keep = index
+
+        for timestamp in self._timestamps[:keep]:
+            generation = self._generations.pop(timestamp)
+
+            for number in range(len(generation.first_ids)):
+                self._cache.pop((timestamp, number), None)
+
+            self._path(timestamp).unlink(missing_ok=True)
+
+        del self._timestamps[:keep]
+
+    def growth(self, nation: int, days: float) -> typing.Optional[Growth]:
+        """
+        Compares a nation's latest values to the last generation recorded at least days ago.
+        """
+        with self._lock:
+            if not self._timestamps:
+                return None
+
+            latest = len(self._timestamps) - 1
+            index = max(bisect.bisect_right(self._timestamps, time.time() - days * 86400) - 1, 0)
+            now, then = self._value_at(latest, nation), self._value_at(index, nation)
+
+            if now is None or then is None:
+                return None
+
+            return Growth(
+                self._timestamps[index],
+                (now[0] - then[0]) / 100,
+                now[1] - then[1],
+                (now[2] - then[2]) / 100,
+            )
@@ -0,0 +1,133 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from extensions.politics_and_war import background, history, stats, targets
+from lib.utils import extra
+
+import asyncio
+import logging
+import pathlib
+import typing
+import zlib
+import attr
+
+
+_LOGGER = logging.getLogger("requiem.politics_and_war")
+_NAME_FIELDS = {
+    "nations": "nation_name",
+    "alliances": "name",
+}
+
+
+class Identities:
+    """
+    Owns the nation and alliance autocomplete indexes, the war target index, the alliance statistics, the nation
+    history and the sync state they were built from.
+    Instances can be passed directly to the sync functions as a page handler.
+    """
+
+    __slots__: typing.List[str] = ["nations", "alliances", "targets", "stats", "history", "state"]
+
+    def __init__(self) -> None:
+        self.nations: extra.AutoCompleteIndex = extra.AutoCompleteIndex()
+        self.alliances: extra.AutoCompleteIndex = extra.AutoCompleteIndex()
+        self.targets: targets.TargetIndex = targets.TargetIndex()
+        self.stats: stats.AllianceStats = stats.AllianceStats()
+        self.history: typing.Optional[history.NationHistory] = None
+        self.state: background.SyncState = background.SyncState()
+
+    async def __call__(self, kind: str, rows: list) -> None:
+        index = getattr(self, kind)
+        field = _NAME_FIELDS[kind]
+
+        for row in rows:
+            index.insert(row[field])
+
+        await self.targets(kind, rows)
+        await self.stats(kind, rows)
+
+    async def commit(self, directory: pathlib.Path, merge: bool) -> None:
+        """
+        Swaps in the rows collected during a sync and writes a fresh snapshot to disk.
+        Passing merge keeps previously indexed names, for applying deltas. Full syncs are also added to the history.
+        """
+        await asyncio.gather(
+            self.nations.rebuild(merge),
+            self.alliances.rebuild(merge),
+            self.targets.rebuild(merge),
+        )
+        await self.stats.rebuild(self.targets.nations, merge)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.save, directory)
+
+        if not merge and self.history is not None:
+            await loop.run_in_executor(None, self.history.record, self.targets.nations)
+
+    def save(self, directory: pathlib.Path) -> None:
+        metadata = attr.asdict(self.state)
+        self.nations.save(directory / "snapshots" / "nations.idx", metadata)
+        self.alliances.save(directory / "snapshots" / "alliances.idx", metadata)
+        self.targets.save(directory / "snapshots" / "targets.snap")
+        self.stats.save(directory / "snapshots" / "alliance_names.json")
+
+    def load(self, directory: pathlib.Path) -> None:
+        """
+        Restores the indexes, war state, alliance statistics and sync state from the last snapshot,
+        so commands work before the first sync and that sync only needs to fetch deltas.
+        """
+        self.history = history.NationHistory(directory / "history")
+        self.history.scan()
+
+        nations, alliances = extra.AutoCompleteIndex(), extra.AutoCompleteIndex()
+
+        try:
+            state = background.SyncState(**nations.load(directory / "snapshots" / "nations.idx"))
+            alliances.load(directory / "snapshots" / "alliances.idx")
+
+        except FileNotFoundError:
+            _LOGGER.info("requiem was unable to find an identity snapshot! autocomplete will be empty until synced!")
+            return
+
+        except (ValueError, KeyError, TypeError) as exc:
+            _LOGGER.warning("requiem was unable to read the identity snapshot!", exc_info=exc)
+            return
+
+        self.nations, self.alliances, self.state = nations, alliances, state
+
+        _LOGGER.info(
+            "requiem has restored %s nation(s) and %s alliance(s) from the identity snapshot!",
+            len(self.nations),
+            len(self.alliances),
+        )
+
+        try:
+            self.targets.load(directory / "snapshots" / "targets.snap")
+            self.stats.load(directory / "snapshots" / "alliance_names.json", self.targets.nations)
+
+        except FileNotFoundError:
+            self.targets = targets.TargetIndex()
+            _LOGGER.info("requiem was unable to find a war state snapshot! the next sync will be a full one!")
+            return
+
+        except (ValueError, KeyError, zlib.error) as exc:
+            self.targets = targets.TargetIndex()
+            _LOGGER.warning("requiem was unable to read the war state snapshot!", exc_info=exc)
+            return
+
+        _LOGGER.info("requiem has restored the war state of %s nation(s)!", len(self.targets))
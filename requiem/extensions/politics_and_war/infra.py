@@ -0,0 +1,157 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import array
+import functools
+import heapq
+import itertools
+import typing
+import pwpy
+
+
+_STEP = 100
+
+
+def _unit_cost(amount: float) -> float:
+    return round(((abs(amount - 10) ** 2.2) / 710) + 300, 2)
+
+
+class InfraCurve:
+    """
+    Computes infra costs from cumulative tables instead of walking the cost curve.
+
+    Infra is bought in steps of 100 priced at the infra held when each step begins, so the steps taken depend
+    on where a purchase starts. Amounts are quantized to the given resolution and one cumulative table is kept
+    per offset into a step, letting any range be answered with a subtraction. Results match pwpy.utils.infra_cost
+    for every amount on the resolution grid up to limit. Amounts above limit fall back to pwpy.
+    """
+
+    __slots__: typing.List[str] = ["_resolution", "_limit", "_table"]
+
+    def __init__(self, resolution: int = 100, limit: float = 20000, tables: int = 4096) -> None:
+        self._resolution: int = resolution
+        self._limit: float = limit
+        self._table: typing.Callable[[int], array.array] = functools.lru_cache(maxsize=tables)(self._build_table)
+
+    def _build_table(self, offset: int) -> array.array:
+        """
+        Builds the cumulative cost of whole steps starting offset grid units into a step.
+        """
+        start = offset / self._resolution
+        steps = int(self._limit // _STEP) + 1
+        costs = (_unit_cost(start + _STEP * step) * _STEP for step in range(steps))
+
+        return array.array("d", itertools.accumulate(costs, initial=0.0))
+
+    def cost(self, starting: float, target: float) -> float:
+        """
+        Calculate the cost to purchase or sell infrastructure.
+        """
+        if max(starting, target) > self._limit:
+            return pwpy.utils.infra_cost(starting, target)
+
+        resolution = self._resolution
+        step = _STEP * resolution
+        position = round(starting * resolution)
+        difference = round(target * resolution) - position
+
+        if difference < 0:
+            return 150 * difference / resolution
+
+        cost = 0.0
+
+        if difference > step and difference % step:
+            delta = difference % step
+            cost += _unit_cost(position / resolution) * delta / resolution
+            position += delta
+            difference -= delta
+
+        whole, remainder = divmod(difference, step)
+
+        if whole:
+            offset, first = position % step, position // step
+            table = self._table(offset)
+            cost += table[first + whole] - table[first]
+            position += whole * step
+
+        if remainder:
+            cost += _unit_cost(position / resolution) * remainder / resolution
+
+        return cost
+
+    def costs(self, pairs: typing.Iterable[typing.Tuple[float, float]]) -> typing.List[float]:
+        """
+        Calculate the costs for many starting and target pairs in one call.
+        """
+        return [self.cost(starting, target) for starting, target in pairs]
+
+    def plan(
+        self,
+        starting: typing.Sequence[float],
+        budget: float,
+        limit: typing.Optional[float] = None,
+    ) -> typing.List[float]:
+        """
+        Spreads a budget across cities to buy as much infra as possible, returning the target for each city.
+
+        Buying whole steps in the cheapest city first is optimal because step prices only rise with infra held.
+        Whatever budget is left once no whole step is affordable buys a partial step in the cheapest city.
+        """
+        limit = min(limit or self._limit, self._limit)
+        targets = list(starting)
+        remaining = budget
+        heap = [
+            (_unit_cost(amount) * _STEP, city)
+            for city, amount in enumerate(targets)
+            if amount + _STEP <= limit
+        ]
+        heapq.heapify(heap)
+
+        while heap and heap[0][0] <= remaining:
+            price, city = heapq.heappop(heap)
+            remaining -= price
+            targets[city] += _STEP
+
+            if targets[city] + _STEP <= limit:
+                heapq.heappush(heap, (_unit_cost(targets[city]) * _STEP, city))
+
+        open_cities = [city for city, amount in enumerate(targets) if amount < limit]
+
+        if not open_cities or remaining <= 0:
+            return targets
+
+        city = min(open_cities, key=lambda index: _unit_cost(targets[index]))
+        spent = budget - remaining - self.cost(starting[city], targets[city])
+        low = round(targets[city] * self._resolution)
+        high = round(min(targets[city] + _STEP, limit) * self._resolution)
+
+        while low < high:
+            middle = (low + high + 1) // 2
+
+            if spent + self.cost(starting[city], middle / self._resolution) <= budget:
+                low = middle
+
+            else:
+                high = middle - 1
+
+        targets[city] = low / self._resolution
+
+        return targets
+
+
+curve = InfraCurve()
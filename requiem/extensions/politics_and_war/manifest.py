@@ -0,0 +1,209 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from extensions.politics_and_war import sync
+from lib.utils import extra
+
+import typing
+import hikari
+import lightbulb
+
+
+handlers = extra.LazyModule("extensions.politics_and_war.commands")
+
+
+@lightbulb.command("infra", "Calculate the cost of buying or selling infra.")
+@lightbulb.implements(lightbulb.SlashCommandGroup)
+async def infra(ctx: lightbulb.Context) -> None:
+    pass
+
+
+@lightbulb.option(
+    name="nation",
+    description="The nation to calculate infra costs for.",
+    type=str,
+    required=True,
+    autocomplete=True,
+)
+@lightbulb.option(
+    name="target",
+    description="The target infra amount.",
+    type=float,
+    required=True,
+    min_value=.01
+)
+@infra.child()
+@lightbulb.command("auto", "Automatically calculate the costs for a given nation or city.")
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def infra_auto(ctx: lightbulb.Context) -> None:
+    await handlers.get().infra_auto(ctx)
+
+
+@infra_auto.autocomplete("nation")
+async def infra_auto_nation(
+    option: hikari.AutocompleteInteractionOption,
+    interaction: hikari.AutocompleteInteraction,
+) -> typing.List[str]:
+    return sync.identities.nations.search(option.value, interaction.user.id, 25)
+
+
+@lightbulb.option(
+    name="starting",
+    description="The starting infra amount.",
+    type=float,
+    required=True,
+    min_value=.01
+)
+@lightbulb.option(
+    name="target",
+    description="The target infra amount.",
+    type=float,
+    required=True,
+    min_value=.01
+)
+@lightbulb.option(
+    name="cities",
+    description="The number of cities to multiply th cost by.",
+    type=int,
+    min_value=1
+)
+@infra.child()
+@lightbulb.command("manual", "Calculate the cost of buying or selling infra.")
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def infra_manual(ctx: lightbulb.Context) -> None:
+    await handlers.get().infra_manual(ctx)
+
+
+@lightbulb.option(
+    name="nation",
+    description="The nation to plan infra purchases for.",
+    type=str,
+    required=True,
+    autocomplete=True,
+)
+@lightbulb.option(
+    name="budget",
+    description="The amount of money to spend on infra.",
+    type=float,
+    required=True,
+    min_value=1
+)
+@lightbulb.option(
+    name="limit",
+    description="The most infra any single city should be brought to.",
+    type=float,
+    required=False,
+    min_value=.01
+)
+@infra.child()
+@lightbulb.command("plan", "Calculate how to spread a budget across a nation's cities.")
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def infra_plan(ctx: lightbulb.Context) -> None:
+    await handlers.get().infra_plan(ctx)
+
+
+@infra_plan.autocomplete("nation")
+async def infra_plan_nation(
+    option: hikari.AutocompleteInteractionOption,
+    interaction: hikari.AutocompleteInteraction,
+) -> typing.List[str]:
+    return sync.identities.nations.search(option.value, interaction.user.id, 25)
+
+
+@lightbulb.option(
+    name="nation",
+    description="The nation to find targets for.",
+    type=str,
+    required=True,
+    autocomplete=True,
+)
+@lightbulb.command("targets", "Find unaligned nations within war range of a nation.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def targets(ctx: lightbulb.Context) -> None:
+    await handlers.get().targets(ctx)
+
+
+@targets.autocomplete("nation")
+async def targets_nation(
+    option: hikari.AutocompleteInteractionOption,
+    interaction: hikari.AutocompleteInteraction,
+) -> typing.List[str]:
+    return sync.identities.nations.search(option.value, interaction.user.id, 25)
+
+
+@lightbulb.command("alliance", "View statistics about alliances.")
+@lightbulb.implements(lightbulb.SlashCommandGroup)
+async def alliance(ctx: lightbulb.Context) -> None:
+    pass
+
+
+@lightbulb.option(
+    name="alliance",
+    description="The alliance to view statistics for.",
+    type=str,
+    required=True,
+    autocomplete=True,
+)
+@alliance.child()
+@lightbulb.command("stats", "View aggregate statistics for an alliance.")
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def alliance_stats(ctx: lightbulb.Context) -> None:
+    await handlers.get().alliance_stats(ctx)
+
+
+@alliance_stats.autocomplete("alliance")
+async def alliance_stats_alliance(
+    option: hikari.AutocompleteInteractionOption,
+    interaction: hikari.AutocompleteInteraction,
+) -> typing.List[str]:
+    return sync.identities.alliances.search(option.value, interaction.user.id, 25)
+
+
+@alliance.child()
+@lightbulb.command("leaderboard", "View the highest scoring alliances.")
+@lightbulb.implements(lightbulb.SlashSubCommand)
+async def alliance_leaderboard(ctx: lightbulb.Context) -> None:
+    await handlers.get().alliance_leaderboard(ctx)
+
+
+@lightbulb.option(
+    name="nation",
+    description="The nation to view growth for.",
+    type=str,
+    required=True,
+    autocomplete=True,
+)
+@lightbulb.option(
+    name="days",
+    description="How many days back to compare against.",
+    type=int,
+    required=False,
+    default=7,
+    min_value=1,
+)
+@lightbulb.command("growth", "View how much a nation has grown over the last few days.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def growth(ctx: lightbulb.Context) -> None:
+    await handlers.get().growth(ctx)
+
+
+@growth.autocomplete("nation")
+async def growth_nation(
+    option: hikari.AutocompleteInteractionOption,
+    interaction: hikari.AutocompleteInteraction,
+) -> typing.List[str]:
+    return sync.identities.nations.search(option.value, interaction.user.id, 25)
@@ -0,0 +1,138 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import json
+import typing
+
+
+Fields = typing.Sequence[typing.Union[str, typing.Tuple[str, "Fields"], typing.Tuple[str, "Fields", int]]]
+
+
+class Enum(str):
+    """
+    A graphql enum value. Rendered bare rather than as a quoted string.
+    """
+
+
+def _render_value(value: typing.Any) -> str:
+    if isinstance(value, Enum):
+        return str(value)
+
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    if isinstance(value, (int, float)):
+        return str(value)
+
+    if isinstance(value, str):
+        return json.dumps(value)
+
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{key}: {_render_value(item)}" for key, item in value.items()) + "}"
+
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_render_value(item) for item in value) + "]"
+
+    raise TypeError(f"unable to render {value!r} as a graphql value!")
+
+
+def render_fields(fields: Fields) -> str:
+    """
+    Renders field names and (name, subfields) pairs as a graphql selection set.
+    A list field may carry a third value, the number of items expected per row, which only affects cost.
+    """
+    parts = []
+
+    for field in fields:
+        if isinstance(field, tuple):
+            name, subfields = field[:2]
+            parts.append(f"{name} {{ {render_fields(subfields)} }}")
+
+        else:
+            parts.append(field)
+
+    return " ".join(parts)
+
+
+def _count_fields(fields: Fields) -> int:
+    return sum(
+        _count_fields(field[1]) * (field[2] if len(field) > 2 else 1) if isinstance(field, tuple) else 1
+        for field in fields
+    )
+
+
+class PageQuery(typing.NamedTuple):
+    """
+    One page of a paginated api collection, such as nations or alliances.
+    """
+
+    alias: str
+    kind: str
+    arguments: typing.Dict[str, typing.Any]
+    fields: Fields
+
+    @property
+    def cost(self) -> int:
+        """
+        A rough estimate of the response size, the rows requested multiplied by the fields per row.
+        Fields of nested lists are counted once for each item the list is expected to hold.
+        """
+        return int(self.arguments.get("first", 1)) * max(_count_fields(self.fields), 1)
+
+    def render(self) -> str:
+        arguments = ", ".join(f"{key}: {_render_value(value)}" for key, value in self.arguments.items())
+
+        return f"{self.alias}: {self.kind}({arguments}) {{ data {{ {render_fields(self.fields)} }} }}"
+
+
+def page_query(kind: str, page: int, first: int, fields: Fields, **arguments: typing.Any) -> PageQuery:
+    return PageQuery(
+        f"{kind.upper()}_{page}",
+        kind,
+        {"first": first, "page": page, **arguments},
+        fields,
+    )
+
+
+def render_batch(queries: typing.Iterable[PageQuery]) -> str:
+    return " ".join(query.render() for query in queries)
+
+
+def pack(
+    queries: typing.Iterable[PageQuery],
+    budget: int,
+    max_queries: int = 10,
+) -> typing.Iterator[typing.List[PageQuery]]:
+    """
+    Groups page queries into batches whose combined cost stays within budget.
+    A single query costing more than the budget is sent in a batch of its own.
+    """
+    batch: typing.List[PageQuery] = []
+    cost = 0
+
+    for query in queries:
+        if batch and (cost + query.cost > budget or len(batch) >= max_queries):
+            yield batch
+            batch, cost = [], 0
+
+        batch.append(query)
+        cost += query.cost
+
+    if batch:
+        yield batch
+
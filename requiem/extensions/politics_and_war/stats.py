@@ -0,0 +1,160 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import asyncio
+import bisect
+import json
+import os
+import pathlib
+import typing
+
+
+CITY_TIERS: typing.Tuple[int, ...] = (0, 10, 15, 20, 25, 30)
+
+
+class AllianceAggregate(typing.NamedTuple):
+    id: int
+    name: str
+    members: int
+    score: float
+    min_cities: int
+    max_cities: int
+    cities: int
+    infra: float
+    tiers: typing.Tuple[int, ...]
+
+    @property
+    def average_cities(self) -> float:
+        return self.cities / self.members if self.members else 0.0
+
+    @property
+    def average_infra(self) -> float:
+        return self.infra / self.cities if self.cities else 0.0
+
+
+def _aggregate(
+    nations: typing.Mapping[int, typing.Any],
+    names: typing.Mapping[int, str],
+) -> typing.Dict[int, AllianceAggregate]:
+    """
+    Groups every aligned nation by alliance in a single pass.
+    """
+    totals: typing.Dict[int, list] = {}
+
+    for nation in nations.values():
+        if not nation.alliance:
+            continue
+
+        cities = nation.cities
+        total = totals.get(nation.alliance)
+
+        if total is None:
+            total = totals[nation.alliance] = [0, 0.0, cities, cities, 0, 0.0, [0] * len(CITY_TIERS)]
+
+        total[0] += 1
+        total[1] += nation.score
+        total[2] = min(total[2], cities)
+        total[3] = max(total[3], cities)
+        total[4] += cities
+        total[5] += nation.infra
+        total[6][bisect.bisect_right(CITY_TIERS, cities) - 1] += 1
+
+    return {
+        alliance: AllianceAggregate(
+            alliance, names.get(alliance, str(alliance)), members, score, low, high, cities, infra, tuple(tiers)
+        )
+        for alliance, (members, score, low, high, cities, infra, tiers) in totals.items()
+    }
+
+
+class AllianceStats:
+    """
+    Per alliance aggregates and a score leaderboard, recomputed once per sync generation.
+    Instances can be passed directly to the sync functions as a page handler to collect alliance names.
+    """
+
+    __slots__: typing.List[str] = ["_names", "_lookup", "_aggregates", "_leaderboard", "_pending"]
+
+    def __init__(self) -> None:
+        self._names: typing.Dict[int, str] = {}
+        self._lookup: typing.Dict[str, int] = {}
+        self._aggregates: typing.Dict[int, AllianceAggregate] = {}
+        self._leaderboard: typing.Tuple[AllianceAggregate, ...] = ()
+        self._pending: typing.Dict[int, str] = {}
+
+    async def __call__(self, kind: str, rows: list) -> None:
+        if kind != "alliances":
+            return
+
+        for row in rows:
+            self._pending[int(row["id"])] = row["name"]
+
+    @staticmethod
+    def _build(nations: typing.Mapping[int, typing.Any], names: typing.Dict[int, str]) -> tuple:
+        aggregates = _aggregate(nations, names)
+        leaderboard = tuple(sorted(aggregates.values(), key=lambda aggregate: aggregate.score, reverse=True))
+        lookup = {name.lower(): alliance for alliance, name in names.items()}
+
+        return names, lookup, aggregates, leaderboard
+
+    async def rebuild(self, nations: typing.Mapping[int, typing.Any], merge: bool = False) -> None:
+        """
+        Recomputes every aggregate from a nation snapshot in a worker thread and swaps them in once complete.
+        Passing merge keeps alliance names that were not part of this sync.
+        """
+        pending, self._pending = self._pending, {}
+
+        if merge:
+            pending = {**self._names, **pending}
+
+        loop = asyncio.get_running_loop()
+        built = await loop.run_in_executor(None, self._build, nations, pending)
+        self._names, self._lookup, self._aggregates, self._leaderboard = built
+
+    def save(self, path: pathlib.Path) -> None:
+        """
+        Writes the alliance names to a snapshot. Aggregates are recomputed from the target snapshot on load.
+        """
+        temp = path.with_suffix(path.suffix + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(temp, "w") as stream:
+            json.dump({"names": self._names}, stream)
+
+        os.replace(temp, path)
+
+    def load(self, path: pathlib.Path, nations: typing.Mapping[int, typing.Any]) -> None:
+        """
+        Restores the alliance names written by save and recomputes every aggregate from nations. Blocking.
+        """
+        with open(path) as stream:
+            names = {int(alliance): name for alliance, name in json.load(stream)["names"].items()}
+
+        self._names, self._lookup, self._aggregates, self._leaderboard = self._build(nations, names)
+
+    def lookup(self, value: str) -> typing.Optional[AllianceAggregate]:
+        """
+        Finds an alliance's aggregate by id or name.
+        """
+        value = value.strip()
+        alliance = int(value) if value.isdigit() else self._lookup.get(value.lower())
+
+        return self._aggregates.get(alliance)
+
+    def leaderboard(self, results: int = 10) -> typing.Tuple[AllianceAggregate, ...]:
+        return self._leaderboard[:results]
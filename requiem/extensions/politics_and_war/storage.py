@@ -0,0 +1,161 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import datetime
+import logging
+import typing
+import tortoise
+
+
+_LOGGER = logging.getLogger("requiem.politics_and_war")
+
+_COLUMNS = {
+    "nations": ("id", "name", "name_lower", "leader", "leader_lower", "created_at"),
+    "alliances": ("id", "name", "name_lower", "acronym", "created_at"),
+}
+_POSTGRES_TYPES = {
+    "id": "bigint",
+    "created_at": "timestamptz",
+}
+
+
+def _parse_date(value: typing.Optional[str]) -> typing.Optional[datetime.datetime]:
+    if not value:
+        return None
+
+    try:
+        date = datetime.datetime.fromisoformat(value)
+
+    except ValueError:
+        return None
+
+    return date if date.tzinfo else date.replace(tzinfo=datetime.timezone.utc)
+
+
+def _nation_row(data: dict) -> tuple:
+    name = data["nation_name"]
+    leader = data["leader_name"]
+    return int(data["id"]), name, name.lower(), leader, leader.lower(), _parse_date(data.get("date"))
+
+
+def _alliance_row(data: dict) -> tuple:
+    name = data["name"]
+    return int(data["id"]), name, name.lower(), data.get("acronym") or "", _parse_date(data.get("date"))
+
+
+_ROW_BUILDERS = {
+    "nations": _nation_row,
+    "alliances": _alliance_row,
+}
+
+
+def _postgres_upsert(table: str, columns: typing.Sequence[str]) -> str:
+    arrays = ", ".join(
+        f"${position}::{_POSTGRES_TYPES.get(column, 'text')}[]"
+        for position, column in enumerate(columns, 1)
+    )
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns[1:])
+
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) SELECT * FROM unnest({arrays}) "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}"
+    )
+
+
+def _sqlite_upsert(table: str, columns: typing.Sequence[str]) -> str:
+    placeholders = ", ".join("?" for _ in columns)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}"
+    )
+
+
+def available() -> bool:
+    """
+    Whether the database connection was set up, so identity rows have somewhere to go.
+    """
+    try:
+        tortoise.Tortoise.get_connection("default")
+
+    except (KeyError, tortoise.exceptions.ConfigurationError):
+        return False
+
+    return True
+
+
+async def upsert(kind: str, rows: typing.Sequence[tuple]) -> None:
+    """
+    Writes rows to the nations or alliances table in a single round trip.
+    Postgres receives one array per column through unnest, sqlite falls back to executemany.
+    Rows sharing an id are collapsed to the last one, as postgres refuses to update a row twice in one statement.
+    """
+    rows = list({row[0]: row for row in rows}.values())
+
+    if not rows:
+        return
+
+    columns = _COLUMNS[kind]
+    connection = tortoise.Tortoise.get_connection("default")
+
+    if connection.capabilities.dialect == "postgres":
+        await connection.execute_query(_postgres_upsert(kind, columns), [list(column) for column in zip(*rows)])
+
+    else:
+        await connection.execute_many(_sqlite_upsert(kind, columns), [list(row) for row in rows])
+
+
+class UpsertBatcher:
+    """
+    Collects identity rows as pages arrive and flushes them to the database in batches.
+    Pending rows are keyed by id so a nation seen on two pages during a crawl is only written once, last row winning.
+    Instances can be passed directly to the sync functions as a page handler.
+    """
+
+    __slots__: typing.List[str] = ["_batch_size", "_pending", "written"]
+
+    def __init__(self, batch_size: int = 5000) -> None:
+        self._batch_size: int = batch_size
+        self._pending: typing.Dict[str, typing.Dict[int, tuple]] = {kind: {} for kind in _COLUMNS}
+        self.written: int = 0
+
+    async def __call__(self, kind: str, rows: list) -> None:
+        pending = self._pending[kind]
+        build = _ROW_BUILDERS[kind]
+
+        for row in rows:
+            built = build(row)
+            pending[built[0]] = built
+
+        if len(pending) >= self._batch_size:
+            await self._flush(kind)
+
+    async def _flush(self, kind: str) -> None:
+        rows, self._pending[kind] = self._pending[kind], {}
+        await upsert(kind, list(rows.values()))
+        self.written += len(rows)
+
+    async def flush(self) -> None:
+        """
+        Writes any rows still waiting for a full batch.
+        """
+        for kind in _COLUMNS:
+            await self._flush(kind)
+
+        _LOGGER.debug("requiem has written %s identity row(s) to the database!", self.written)
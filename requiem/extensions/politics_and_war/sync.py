@@ -0,0 +1,75 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from extensions.politics_and_war import api, background, identity, storage
+from lib import client
+from lightbulb.ext import tasks
+
+import functools
+
+
+identities = identity.Identities()
+key_pool = api.KeyPool()
+sync_scheduler = background.SyncScheduler(background.SyncTrigger())
+
+
+async def run_sync(bot: client.Requiem, run: background.SyncRun) -> None:
+    """
+    Syncs nations and alliances into the identity indexes and the database, then commits a new snapshot.
+    Between reconciliations every nation's war state is refreshed once every pnw_war_state_interval seconds.
+    A full reconciliation is forced while the target index is empty, as when no war state snapshot was found.
+    """
+    config = bot.config
+    reconcile_interval = config.pnw_reconcile_interval if identities.targets.nations else 0
+    batcher = storage.UpsertBatcher() if storage.available() else None
+
+    async def handler(kind: str, rows: list) -> None:
+        run.rows += len(rows)
+        await identities(kind, rows)
+
+        if batcher is not None:
+            await batcher(kind, rows)
+
+    async def refresh(kind: str, rows: list) -> None:
+        run.rows += len(rows)
+        await identities.targets.refresh(kind, rows)
+
+    run.full = identities.state.reconcile_due(reconcile_interval)
+    run.pages = await background.sync_identities(
+        bot.session,
+        key_pool,
+        handler,
+        identities.state,
+        reconcile_interval=reconcile_interval,
+        refresh=refresh,
+        refresh_interval=config.pnw_war_state_interval,
+        concurrency=config.pnw_sync_concurrency,
+        budget=config.pnw_sync_budget,
+    )
+
+    if batcher is not None:
+        await batcher.flush()
+
+    await identities.commit(client.DATA_DIR, merge=not run.full)
+
+
+@tasks.task(sync_scheduler.trigger, pass_app=True)
+async def sync_task(bot: client.Requiem) -> None:
+    if not key_pool:
+        return
+
+    await sync_scheduler.run(functools.partial(run_sync, bot))
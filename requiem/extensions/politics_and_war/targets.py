@@ -0,0 +1,242 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import array
+import asyncio
+import bisect
+import os
+import pathlib
+import struct
+import sys
+import time
+import typing
+import zlib
+import pwpy
+
+
+_SNAPSHOT_MAGIC = b"RQTI"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<4sHdII")
+_SNAPSHOT_COLUMNS = (("ids", "q"), ("scores", "d"), ("alliances", "q"), ("cities", "q"), ("infra", "d"), ("flags", "B"))
+
+
+def _column_bytes(typecode: str, values: typing.Iterable) -> bytes:
+    column = array.array(typecode, values)
+
+    if sys.byteorder != "little":
+        column.byteswap()
+
+    return column.tobytes()
+
+
+def _column(typecode: str, data: bytes) -> array.array:
+    column = array.array(typecode)
+    column.frombytes(data)
+
+    if sys.byteorder != "little":
+        column.byteswap()
+
+    return column
+
+
+class _Nation(typing.NamedTuple):
+    name: str
+    score: float
+    alliance: int
+    cities: int
+    infra: float
+    vacation: bool
+    beige: bool
+
+
+class TargetIndex:
+    """
+    Keeps every synced nation's war state and a score sorted array of the nations that can currently be raided.
+    Instances can be passed directly to the sync functions as a page handler, and refresh to refresh_war_state.
+    """
+
+    __slots__: typing.List[str] = [
+        "_nations", "_names", "_scores", "_ids", "_pending", "_rebuild_lock", "updated_at"
+    ]
+
+    def __init__(self) -> None:
+        self._nations: typing.Dict[int, _Nation] = {}
+        self._names: typing.Dict[str, int] = {}
+        self._scores: array.array = array.array("d")
+        self._ids: array.array = array.array("q")
+        self._pending: typing.Dict[int, _Nation] = {}
+        self._rebuild_lock: asyncio.Lock = asyncio.Lock()
+        self.updated_at: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self._nations)
+
+    @property
+    def nations(self) -> typing.Dict[int, _Nation]:
+        return self._nations
+
+    async def __call__(self, kind: str, rows: list) -> None:
+        if kind != "nations":
+            return
+
+        for row in rows:
+            nation_id = int(row["id"])
+
+            if "cities" in row:
+                infra = sum(float(city["infrastructure"]) for city in row["cities"] or ())
+
+            else:
+                known = self._pending.get(nation_id) or self._nations.get(nation_id)
+                infra = known.infra if known is not None else 0.0
+
+            self._pending[nation_id] = _Nation(
+                row["nation_name"],
+                float(row["score"]),
+                int(row["alliance_id"] or 0),
+                int(row["num_cities"]),
+                infra,
+                int(row["vacation_mode_turns"] or 0) > 0,
+                row["color"] == "beige" or int(row["beige_turns"] or 0) > 0,
+            )
+
+    async def refresh(self, kind: str, rows: list) -> None:
+        """
+        Updates the war state of nations already known, keeping their names and infra.
+        Unknown nations are skipped, they are picked up by the next delta sync or reconciliation.
+        """
+        for row in rows:
+            nation_id = int(row["id"])
+            nation = self._pending.get(nation_id) or self._nations.get(nation_id)
+
+            if nation is None:
+                continue
+
+            self._pending[nation_id] = nation._replace(
+                score=float(row["score"]),
+                alliance=int(row["alliance_id"] or 0),
+                cities=int(row["num_cities"]),
+                vacation=int(row["vacation_mode_turns"] or 0) > 0,
+                beige=row["color"] == "beige" or int(row["beige_turns"] or 0) > 0,
+            )
+
+    @staticmethod
+    def _build(nations: typing.Dict[int, _Nation]) -> tuple:
+        targets = sorted(
+            (nation.score, nation_id)
+            for nation_id, nation in nations.items()
+            if not nation.alliance and not nation.vacation and not nation.beige
+        )
+        names = {nation.name.lower(): nation_id for nation_id, nation in nations.items()}
+        scores = array.array("d", (score for score, _ in targets))
+        ids = array.array("q", (nation_id for _, nation_id in targets))
+
+        return nations, names, scores, ids
+
+    async def rebuild(self, merge: bool = False) -> None:
+        """
+        Builds the next score index from the pending rows in a worker thread and swaps it in once complete.
+        Passing merge keeps nations that were not part of this sync.
+        """
+        async with self._rebuild_lock:
+            pending, self._pending = self._pending, {}
+
+            if merge:
+                pending = {**self._nations, **pending}
+
+            loop = asyncio.get_running_loop()
+            built = await loop.run_in_executor(None, self._build, pending)
+            self._nations, self._names, self._scores, self._ids = built
+            self.updated_at = time.time()
+
+    def save(self, path: pathlib.Path) -> None:
+        """
+        Writes every nation's war state to a compressed columnar snapshot, replacing any existing one atomically.
+        """
+        nations = self._nations
+        ids = list(nations)
+        rows = [nations[nation_id] for nation_id in ids]
+        names = "\0".join(nation.name for nation in rows).encode()
+        columns = (
+            ids,
+            (nation.score for nation in rows),
+            (nation.alliance for nation in rows),
+            (nation.cities for nation in rows),
+            (nation.infra for nation in rows),
+            (nation.vacation | nation.beige << 1 for nation in rows),
+        )
+        payload = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, self.updated_at, len(ids), len(names))]
+        payload.extend(_column_bytes(typecode, values) for (_, typecode), values in zip(_SNAPSHOT_COLUMNS, columns))
+        payload.append(names)
+
+        temp = path.with_suffix(path.suffix + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp.write_bytes(zlib.compress(b"".join(payload), 6))
+        os.replace(temp, path)
+
+    def load(self, path: pathlib.Path) -> None:
+        """
+        Restores a snapshot written by save and builds the score index from it. Blocking.
+        """
+        data = zlib.decompress(path.read_bytes())
+        magic, version, updated_at, count, names_size = _SNAPSHOT_HEADER.unpack_from(data)
+
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            raise ValueError("unsupported target snapshot!")
+
+        offset = _SNAPSHOT_HEADER.size
+        columns = []
+
+        for _, typecode in _SNAPSHOT_COLUMNS:
+            size = count * array.array(typecode).itemsize
+            columns.append(_column(typecode, data[offset:offset + size]))
+            offset += size
+
+        names = data[offset:offset + names_size].decode().split("\0") if count else []
+        nations = {
+            nation_id: _Nation(name, score, alliance, cities, infra, bool(flags & 1), bool(flags & 2))
+            for nation_id, score, alliance, cities, infra, flags, name in zip(*columns, names)
+        }
+        self._nations, self._names, self._scores, self._ids = self._build(nations)
+        self.updated_at = updated_at
+
+    def lookup(self, value: str) -> typing.Optional[typing.Tuple[int, _Nation]]:
+        """
+        Finds a synced nation by id or name.
+        """
+        value = value.strip()
+        nation_id = int(value) if value.isdigit() else self._names.get(value.lower())
+        nation = self._nations.get(nation_id)
+
+        return (nation_id, nation) if nation is not None else None
+
+    def within_range(
+        self,
+        score: float,
+        results: int = 15,
+        exclude: typing.Optional[int] = None,
+    ) -> typing.List[typing.Tuple[int, _Nation]]:
+        """
+        Finds unaligned nations outside of beige and vacation mode that can be declared on from score.
+        The highest scoring targets are returned first. Passing exclude leaves out that nation, usually the attacker.
+        """
+        min_score, max_score = pwpy.utils.score_range(score)
+        start = bisect.bisect_left(self._scores, min_score)
+        end = bisect.bisect_right(self._scores, max_score)
+        ids = [nation_id for nation_id in self._ids[max(start, end - results - 1):end] if nation_id != exclude]
+
+        return [(nation_id, self._nations[nation_id]) for nation_id in reversed(ids[-results:])]
@@ -15,7 +15,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from extensions.requiem_basic import commands
+from extensions.requiem_basic import manifest
 from lib import client
 
 import lightbulb
@@ -23,16 +23,18 @@ import sys
 
 
 plugin = lightbulb.Plugin("Requiem Basic")
-plugin.command(commands.ping)
-plugin.command(commands.about)
-plugin.command(commands.user)
-plugin.command(commands.avatar)
+plugin.command(manifest.ping)
+plugin.command(manifest.about)
+plugin.command(manifest.user)
+plugin.command(manifest.avatar)
 
 
 def load(bot: client.Requiem) -> None:
+    manifest.handlers.bind(bot)
     bot.add_plugin(plugin)
 
 
 def unload(bot: client.Requiem) -> None:
     bot.remove_plugin(plugin)
-    del sys.modules[commands.__name__]
+    manifest.handlers.unload()
+    del sys.modules[manifest.__name__]
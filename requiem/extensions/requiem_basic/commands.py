@@ -22,8 +22,6 @@ import time
 import __init__
 
 
-@lightbulb.command("ping", "View current ping times for Requiem.")
-@lightbulb.implements(lightbulb.SlashCommand)
 async def ping(ctx: lightbulb.Context):
     embed = hikari.Embed(description="Pinging...")
 
@@ -40,8 +38,6 @@ async def ping(ctx: lightbulb.Context):
     await message.edit(embed=embed)
 
 
-@lightbulb.command("about", "View information about Requiem.")
-@lightbulb.implements(lightbulb.SlashCommand)
 async def about(ctx: lightbulb.Context) -> None:
     bot = ctx.bot
     embed = hikari.Embed()
@@ -66,14 +62,6 @@ async def about(ctx: lightbulb.Context) -> None:
     await ctx.respond(embed=embed)
 
 
-@lightbulb.option(
-    "user",
-    "A user to be looked up. Leave blank to lookup yourself.",
-    type=hikari.Member,
-    required=False
-)
-@lightbulb.command("avatar", "View the avatar of a specified user.")
-@lightbulb.implements(lightbulb.SlashCommand)
 async def avatar(ctx: lightbulb.Context) -> None:
     member = ctx.options.user
 
@@ -86,14 +74,6 @@ async def avatar(ctx: lightbulb.Context) -> None:
     await ctx.respond(embed=embed)
 
 
-@lightbulb.option(
-    "user",
-    "A user to be looked up. Leave blank to lookup yourself.",
-    type=hikari.Member,
-    required=False
-)
-@lightbulb.command("userinfo", "View info about a specified user.")
-@lightbulb.implements(lightbulb.SlashCommand)
 async def user(ctx: lightbulb.Context):
     member = ctx.options.user
 
@@ -0,0 +1,61 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from lib.utils import extra
+
+import lightbulb
+import hikari
+
+
+handlers = extra.LazyModule("extensions.requiem_basic.commands")
+
+
+@lightbulb.command("ping", "View current ping times for Requiem.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def ping(ctx: lightbulb.Context) -> None:
+    await handlers.get().ping(ctx)
+
+
+@lightbulb.command("about", "View information about Requiem.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def about(ctx: lightbulb.Context) -> None:
+    await handlers.get().about(ctx)
+
+
+@lightbulb.option(
+    "user",
+    "A user to be looked up. Leave blank to lookup yourself.",
+    type=hikari.Member,
+    required=False
+)
+@lightbulb.command("avatar", "View the avatar of a specified user.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def avatar(ctx: lightbulb.Context) -> None:
+    await handlers.get().avatar(ctx)
+
+
+@lightbulb.option(
+    "user",
+    "A user to be looked up. Leave blank to lookup yourself.",
+    type=hikari.Member,
+    required=False
+)
+@lightbulb.command("userinfo", "View info about a specified user.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def user(ctx: lightbulb.Context) -> None:
+    await handlers.get().user(ctx)
@@ -15,7 +15,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from extensions.verins_lunchbox import commands
+from extensions.verins_lunchbox import manifest
 from lib import client
 
 import lightbulb
@@ -23,14 +23,16 @@ import sys
 
 
 plugin = lightbulb.Plugin("Verins Lunchbox")
-plugin.command(commands.neko)
-plugin.command(commands.foxgirl)
+plugin.command(manifest.neko)
+plugin.command(manifest.foxgirl)
 
 
 def load(bot: client.Requiem):
+    manifest.handlers.bind(bot)
     bot.add_plugin(plugin)
 
 
 def unload(bot: client.Requiem):
     bot.remove_plugin(plugin)
-    del sys.modules[commands.__name__]
+    manifest.handlers.unload()
+    del sys.modules[manifest.__name__]
@@ -0,0 +1,138 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import asyncio
+import logging
+import typing
+import aiohttp
+
+
+_LOGGER = logging.getLogger("requiem.verins_lunchbox")
+_NEKOS_URL = "https://nekos.life/api/v2/img/{0}"
+_RETRY_DELAY = 5.0
+_MAX_RETRY_DELAY = 300.0
+
+
+class ImageBuffer:
+    """
+    Keeps a bounded queue of prefetched nekos.life image urls per category so commands can answer immediately.
+    """
+
+    __slots__: typing.List[str] = [
+        "_categories",
+        "_session",
+        "_queues",
+        "_tasks",
+        "_hits",
+        "_misses",
+    ]
+
+    def __init__(self, *categories: str) -> None:
+        self._categories: typing.Tuple[str, ...] = categories
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._queues: typing.Dict[str, asyncio.Queue] = {}
+        self._tasks: typing.List[asyncio.Task] = []
+        self._hits: int = 0
+        self._misses: int = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "buffered": {category: queue.qsize() for category, queue in self._queues.items()},
+        }
+
+    async def _fetch(self, category: str) -> str:
+        async with self._session.get(_NEKOS_URL.format(category)) as response:
+            data = await response.json(content_type="application/json")
+
+        return data["url"]
+
+    async def _refill(self, category: str) -> None:
+        """
+        Keeps the queue for a category topped up. Blocks on a full queue until a url is popped.
+        Any failed fetch is logged and retried with an exponential backoff, so the task never dies.
+        """
+        queue = self._queues[category]
+        failures = 0
+
+        while True:
+            try:
+                url = await self._fetch(category)
+
+            except Exception as exc:
+                delay = min(_RETRY_DELAY * 2 ** failures, _MAX_RETRY_DELAY)
+                failures += 1
+                _LOGGER.warning(
+                    "unable to prefetch an image for %s! retrying in %ss!", category, round(delay), exc_info=exc
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            failures = 0
+            await queue.put(url)
+
+    def start(self, session: aiohttp.ClientSession, depth: int, concurrency: int) -> None:
+        """
+        Creates the queues and starts the background refill tasks.
+        """
+        self._session = session
+
+        for category in self._categories:
+            self._queues[category] = asyncio.Queue(maxsize=max(depth, 1))
+
+            for _ in range(max(concurrency, 1)):
+                self._tasks.append(asyncio.create_task(self._refill(category)))
+
+    def stop(self) -> None:
+        """
+        Cancels the refill tasks and drops any buffered urls.
+        """
+        for task in self._tasks:
+            task.cancel()
+
+        _LOGGER.info(
+            "image buffer served %s hit(s) and %s miss(es)!", self._hits, self._misses
+        )
+
+        self._tasks.clear()
+        self._queues.clear()
+        self._session = None
+
+    async def pop(self, category: str) -> str:
+        """
+        Returns a buffered url for a category. Falls back to a live fetch when the buffer is empty.
+        """
+        if self._session is None:
+            raise RuntimeError("the image buffer has not been started!")
+
+        queue = self._queues.get(category)
+
+        if queue is not None:
+            try:
+                url = queue.get_nowait()
+                self._hits += 1
+                return url
+
+            except asyncio.QueueEmpty:
+                pass
+
+        self._misses += 1
+
+        return await self._fetch(category)
@@ -15,18 +15,35 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+from extensions.verins_lunchbox import buffer
+from lib import client
+
 import lightbulb
 import hikari
 import aiohttp
 
 
-async def session_wrap(url: str) -> dict:
+image_buffer = buffer.ImageBuffer("neko", "fox_girl")
+
+
+def load(bot: client.Requiem) -> None:
+    image_buffer.start(
+        bot.session,
+        bot.config.image_buffer_depth,
+        bot.config.image_buffer_concurrency,
+    )
+
+
+def unload(bot: client.Requiem) -> None:
+    image_buffer.stop()
+
+
+async def fetch_json(session: aiohttp.ClientSession, url: str) -> dict:
     """
-    Creates a one use session async session and returns the response json.
+    Fetches a url using the bots shared session and returns the response json.
     """
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            return await response.json(content_type="application/json")
+    async with session.get(url) as response:
+        return await response.json(content_type="application/json")
 
 
 async def failsafe_neko(reference: str, ctx: lightbulb.Context) -> None:
@@ -34,27 +51,21 @@ async def failsafe_neko(reference: str, ctx: lightbulb.Context) -> None:
     A function to assist in sending of nekos.life payloads and handling NothingFound errors.
     """
     embed = hikari.Embed()
-    data = await session_wrap(f"https://nekos.life/api/v2/img/{reference}")
-    embed.set_image(data["url"])
+    url = await image_buffer.pop(reference)
+    embed.set_image(url)
     await ctx.respond(embed=embed)
 
 
-@lightbulb.command("neko", "Photos of cat girls. My most useful feature.")
-@lightbulb.implements(lightbulb.SlashCommand)
 async def neko(ctx: lightbulb.Context):
     await failsafe_neko("neko", ctx)
 
 
-@lightbulb.command("foxgirl", "Second only to cat girls, we've got photos of fox girls.")
-@lightbulb.implements(lightbulb.SlashCommand)
 async def foxgirl(ctx: lightbulb.Context):
     await failsafe_neko("fox_girl", ctx)
 
 
-@lightbulb.command("catfact", "Learn yourself a cat fact.")
-@lightbulb.implements(lightbulb.SlashCommand)
 async def catfact(ctx: lightbulb.Context):
-    data = await session_wrap("https://catfact.ninja/fact")
+    data = await fetch_json(ctx.bot.session, "https://catfact.ninja/fact")
     embed = hikari.Embed(description=data["fact"])
     embed.set_footer(text="Results provided by https://catfact.ninja/fact")
     await ctx.respond(embed=embed)
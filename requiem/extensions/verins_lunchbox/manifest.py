@@ -0,0 +1,36 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from lib.utils import extra
+
+import lightbulb
+
+
+handlers = extra.LazyModule("extensions.verins_lunchbox.commands")
+
+
+@lightbulb.command("neko", "Photos of cat girls. My most useful feature.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def neko(ctx: lightbulb.Context) -> None:
+    await handlers.get().neko(ctx)
+
+
+@lightbulb.command("foxgirl", "Second only to cat girls, we've got photos of fox girls.")
+@lightbulb.implements(lightbulb.SlashCommand)
+async def foxgirl(ctx: lightbulb.Context) -> None:
+    await handlers.get().foxgirl(ctx)
@@ -13,3 +13,10 @@
 
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pathlib
+import click
+
+
+DATA_DIR = pathlib.Path(click.get_app_dir("requiem"))
@@ -17,14 +17,17 @@
 
 from cattr import global_converter
 from hikari.internal import ux
-from requiem.lib import models
+from lightbulb.ext import tasks
+from requiem.lib import DATA_DIR, models
 
+import contextlib
+import cProfile
+import asyncio
 import shutil
 import logging
 import typing
 import yaml
 import aiohttp
-import click
 import hikari
 import pathlib
 import lightbulb
@@ -34,32 +37,124 @@ import aerich
 import tortoise
 import asyncpg
 import socket
+import time
 import os
 
 
 _LOGGER = logging.getLogger("requiem.client")
 T = typing.TypeVar("T")
-DATA_DIR = pathlib.Path(click.get_app_dir("requiem"))
 
 
-def start_failsafe(debug: bool) -> None:
+def _migrate_config(data: typing.Any) -> typing.Any:
+    """
+    Carries configuration written by older versions of Requiem forward to the current fields.
+    """
+    if isinstance(data, dict) and "pnw_api_key" in data:
+        key = data.pop("pnw_api_key")
+
+        if key and not data.get("pnw_api_keys"):
+            data["pnw_api_keys"] = [key]
+
+    return data
+
+
+def _load_config() -> models.Config:
+    with open(DATA_DIR / "config.yaml") as stream:
+        data = yaml.safe_load(stream)
+
+    return global_converter.structure(_migrate_config(data), models.Config)
+
+
+class BootTimer:
+    """
+    Times each phase of Requiem's startup, optionally profiling the whole boot with cProfile.
+    """
+
+    __slots__: typing.List[str] = ["phases", "extensions", "_started", "_pending", "_profiler", "_profile_path"]
+
+    def __init__(self, profile_path: typing.Optional[pathlib.Path] = None) -> None:
+        self.phases: typing.Dict[str, float] = {}
+        self.extensions: typing.Dict[str, float] = {}
+        self._started: float = time.perf_counter()
+        self._pending: typing.Dict[str, float] = {}
+        self._profiler: typing.Optional[cProfile.Profile] = None
+        self._profile_path: typing.Optional[pathlib.Path] = profile_path
+
+        if profile_path is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @property
+    def elapsed(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def begin(self, name: str) -> None:
+        self._pending[name] = time.perf_counter()
+
+    def end(self, name: str, phases: typing.Optional[typing.Dict[str, float]] = None) -> float:
+        """
+        Records how many milliseconds passed since name began, in phases if given, and returns it.
+        """
+        duration = (time.perf_counter() - self._pending.pop(name)) * 1000
+        (self.phases if phases is None else phases)[name] = duration
+
+        return duration
+
+    @contextlib.contextmanager
+    def phase(self, name: str, phases: typing.Optional[typing.Dict[str, float]] = None) -> typing.Iterator[None]:
+        self.begin(name)
+
+        try:
+            yield
+
+        finally:
+            self.end(name, phases)
+
+    def summary(self) -> str:
+        phases = " ".join(f"{name}={duration:.1f}ms" for name, duration in self.phases.items())
+        extensions = " ".join(f"{name}={duration:.1f}ms" for name, duration in self.extensions.items())
+
+        return f"total={self.elapsed:.1f}ms {phases} extensions=[{extensions}]"
+
+    def finish(self) -> None:
+        """
+        Stops the profiler, if any, and writes its stats to the profile path. Safe to call more than once.
+        """
+        profiler, self._profiler = self._profiler, None
+
+        if profiler is None:
+            return
+
+        profiler.disable()
+
+        try:
+            profiler.dump_stats(self._profile_path)
+
+        except OSError as exc:
+            _LOGGER.warning("requiem was unable to write the boot profile!", exc_info=exc)
+            return
+
+        _LOGGER.info("requiem has written the boot profile to <%s>!", self._profile_path)
+
+
+def start_failsafe(debug: bool, boot_profile: bool = False) -> None:
     """
     Attempts to fetch credentials and start Requiem. Ensures any errors get logged before closing.
+    Passing boot_profile writes a cProfile dump of everything up to the gateway connecting to DATA_DIR/boot.prof.
     """
+    boot = BootTimer(DATA_DIR / "boot.prof" if boot_profile else None)
     flavor = "DEBUG" if debug else "INFO"
     ux.init_logging(flavor, True, True)
 
     try:
         _LOGGER.info("requiem is fetching the configuration!")
 
-        with open(DATA_DIR / "config.yaml") as stream:
-            data = yaml.safe_load(stream)
-
-        credentials = global_converter.structure(data, models.Config)
+        with boot.phase("config"):
+            credentials = _load_config()
 
         _LOGGER.info("requiem has successfully fetched the configuration!")
 
-        requiem = Requiem(credentials)
+        requiem = Requiem(credentials, boot)
         requiem.run()
 
     except FileNotFoundError:
@@ -88,29 +183,55 @@ def start_failsafe(debug: bool) -> None:
             "requiem has encountered a critical exception and crashed!", exc_info=exc
         )
 
+    finally:
+        boot.finish()
+
+
+async def _schema_unchanged(fingerprint: str) -> bool:
+    """
+    Whether the fingerprint stored by the last migration matches the current models.
+    """
+    try:
+        stored = await models.SchemaFingerprints.get_or_none(id=1)
+
+    except tortoise.exceptions.BaseORMException:
+        return False
+
+    return stored is not None and stored.fingerprint == fingerprint
+
 
-async def _setup_database(url: str) -> None:
+async def _setup_database(url: str, force: bool = False) -> None:
     """
     Attempts a connection to a postgresql server. Falls back to using sqlite.
+    Migrations are skipped when the model schema is unchanged since the last run, unless forced.
+    Tortoise is only initialised here for that check. aerich reuses that initialisation, or initialises it itself.
     """
     mig_dir = pathlib.Path(DATA_DIR / "migrations")
+    tortoise_config = {
+        "connections": {
+            "default": url
+        },
+        "apps": {
+            "models": {
+                "models": [
+                    "aerich.models",
+                    "requiem.lib.models"
+                ],
+                "default_connection": "default",
+            },
+        }
+    }
 
     try:
+        if not force and mig_dir.exists():
+            await tortoise.Tortoise.init(config=tortoise_config)
+
+            if await _schema_unchanged(models.schema_fingerprint()):
+                _LOGGER.info("requiem has connected to the postgres server at <%s>! the schema is unchanged!", url)
+                return
+
         command = aerich.Command(
-            tortoise_config={
-                "connections": {
-                    "default": url
-                },
-                "apps": {
-                    "models": {
-                        "models": [
-                            "aerich.models",
-                            "requiem.lib.models"
-                        ],
-                        "default_connection": "default",
-                    },
-                }
-            },
+            tortoise_config=tortoise_config,
             location=str(DATA_DIR / "migrations")
         )
 
@@ -140,6 +261,7 @@ async def _setup_database(url: str) -> None:
         _LOGGER.info("requiem has connected to the postgres server at <%s>!", url)
 
         await tortoise.Tortoise.generate_schemas()
+        await models.SchemaFingerprints.update_or_create({"fingerprint": models.schema_fingerprint()}, id=1)
 
     except (
             tortoise.exceptions.DBConnectionError,
@@ -150,12 +272,57 @@ async def _setup_database(url: str) -> None:
         _LOGGER.warning("requiem was unable to connect to a postgres server!")
 
 
+def run_migrations() -> None:
+    """
+    Runs the database migrations regardless of the stored schema fingerprint.
+    """
+    ux.init_logging("INFO", True, True)
+
+    try:
+        config = _load_config()
+
+    except FileNotFoundError:
+        _LOGGER.warning("requiem was unable to find the configuration! run `requiem setup` to create it!")
+        return
+
+    except (KeyError, TypeError, ValueError):
+        _LOGGER.warning("requiem was unable to read the configuration! run `requiem setup` to recreate it!")
+        return
+
+    async def migrate() -> None:
+        try:
+            await _setup_database(config.database_url, force=True)
+
+        finally:
+            await tortoise.Tortoise.close_connections()
+
+    asyncio.run(migrate())
+
+
+def _create_http_session(config: models.Config) -> aiohttp.ClientSession:
+    """
+    Creates the pooled http session shared by all of Requiem's outbound requests.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=config.http_connections,
+        limit_per_host=config.http_connections_per_host,
+        ttl_dns_cache=config.http_dns_cache_ttl,
+        keepalive_timeout=config.http_keepalive_timeout,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=config.http_timeout,
+        sock_connect=config.http_connect_timeout,
+    )
+
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
 class Requiem(lightbulb.BotApp, abc.ABC):
     """
     Custom Requiem client based on lightbulb.BotApp that overwrites and implements Requiem specific methods.
     """
 
-    def __init__(self, config: models.Config) -> None:
+    def __init__(self, config: models.Config, boot: typing.Optional[BootTimer] = None) -> None:
         super().__init__(
             token=config.discord_token,
             banner=None,
@@ -165,11 +332,16 @@ class Requiem(lightbulb.BotApp, abc.ABC):
         self._config = config
         self._cmds_run = 0
         self._started_at = datetime.datetime.now()
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._boot = boot or BootTimer()
 
         self.subscribe(hikari.StartingEvent, self._handle_starting_operations)
+        self.subscribe(hikari.StartedEvent, self._handle_started_operations)
         self.subscribe(hikari.StoppingEvent, self._handle_stopping_operations)
         self.subscribe(lightbulb.SlashCommandCompletionEvent, self._handle_command_completion)
 
+        tasks.load(self)
+
     @property
     def config(self) -> models.Config:
         return self._config
@@ -178,15 +350,29 @@ class Requiem(lightbulb.BotApp, abc.ABC):
     def cmds_run(self) -> int:
         return self._cmds_run
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("the http session is only available while requiem is running!")
+
+        return self._session
+
     @property
     def uptime(self) -> datetime.timedelta:
         return datetime.datetime.now() - self._started_at
 
     async def _handle_starting_operations(self, _: hikari.StartingEvent) -> None:
         """
-        Attempts to find and load all extensions.
+        Opens the shared http session and attempts to find and load all extensions.
+        Logs how long each phase of the boot took once finished.
         """
-        await _setup_database(self.config.database_url)
+        boot = self._boot
+
+        with boot.phase("http"):
+            self._session = _create_http_session(self.config)
+
+        with boot.phase("database"):
+            await _setup_database(self.config.database_url)
 
         extensions = (
             plugin
@@ -194,23 +380,42 @@ class Requiem(lightbulb.BotApp, abc.ABC):
             if plugin not in ("__init__.py", "__pycache__")
         )
 
-        for extension in extensions:
-            try:
-                self.load_extensions(f"extensions.{extension}")
+        with boot.phase("extensions"):
+            for extension in extensions:
+                try:
+                    with boot.phase(extension, boot.extensions):
+                        self.load_extensions(f"extensions.{extension}")
 
-            except Exception as exc:
-                _LOGGER.error(
-                    f"encountered an exception while attempting to load {extension}!",
-                    exc_info=exc,
-                )
+                except Exception as exc:
+                    _LOGGER.error(
+                        f"encountered an exception while attempting to load {extension}!",
+                        exc_info=exc,
+                    )
 
         _LOGGER.info(
             f"successfully loaded {len(self.extensions)} extension(s) and {len(self.slash_commands)} command(s)!"
         )
+        _LOGGER.info("requiem boot phases: %s", boot.summary())
+
+        boot.begin("gateway")
+
+    async def _handle_started_operations(self, _: hikari.StartedEvent) -> None:
+        """
+        Logs how long the gateway took to connect and finishes the boot profile, if one is being taken.
+        """
+        boot = self._boot
+
+        _LOGGER.info(
+            "requiem has connected to the gateway in %.1fms and finished booting in %.1fms!",
+            boot.end("gateway"),
+            boot.elapsed,
+        )
+
+        boot.finish()
 
     async def _handle_stopping_operations(self, _: hikari.StoppingEvent) -> None:
         """
-        Attempts to unload all loaded extensions and close database connections.
+        Attempts to unload all loaded extensions and close the http session and database connections.
         """
         for extension in self.extensions[::]:
             try:
@@ -222,6 +427,9 @@ class Requiem(lightbulb.BotApp, abc.ABC):
                     exc_info=exc,
                 )
 
+        if self._session is not None:
+            await self._session.close()
+
         await tortoise.Tortoise.close_connections()
 
     async def _handle_command_completion(self, event: lightbulb.SlashCommandCompletionEvent) -> None:
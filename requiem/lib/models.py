@@ -15,16 +15,111 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import hashlib
 import attr
+import json
 import tortoise
 
 
+_SCHEMA_KEYS = (
+    "name",
+    "field_type",
+    "db_column",
+    "generated",
+    "nullable",
+    "unique",
+    "indexed",
+    "constraints",
+    "db_field_types",
+    "raw_field",
+    "on_delete",
+)
+
+
 @attr.s(auto_attribs=True)
 class Config:
     discord_token: str
     database_url: str
     enabled_guilds: list = []
+    http_timeout: float = 15.0
+    http_connect_timeout: float = 5.0
+    http_connections: int = 100
+    http_connections_per_host: int = 10
+    http_dns_cache_ttl: int = 300
+    http_keepalive_timeout: float = 30.0
+    image_buffer_depth: int = 10
+    image_buffer_concurrency: int = 2
+    pnw_api_keys: list = []
+    pnw_requests_per_minute: float = 60.0
+    pnw_request_burst: int = 5
+    pnw_city_cache_ttl: float = 120.0
+    pnw_sync_interval: float = 900.0
+    pnw_sync_jitter: float = 60.0
+    pnw_sync_backoff: float = 60.0
+    pnw_sync_max_backoff: float = 3600.0
+    pnw_sync_concurrency: int = 4
+    pnw_sync_budget: int = 100000
+    pnw_reconcile_interval: float = 86400.0
+    pnw_war_state_interval: float = 3600.0
 
 
 class Guilds(tortoise.Model):
     id: int = tortoise.fields.BigIntField(pk=True)
+
+
+class Nations(tortoise.Model):
+    id: int = tortoise.fields.BigIntField(pk=True)
+    name: str = tortoise.fields.CharField(max_length=255)
+    name_lower: str = tortoise.fields.CharField(max_length=255, index=True)
+    leader: str = tortoise.fields.CharField(max_length=255)
+    leader_lower: str = tortoise.fields.CharField(max_length=255, index=True)
+    created_at = tortoise.fields.DatetimeField(null=True)
+
+
+class Alliances(tortoise.Model):
+    id: int = tortoise.fields.BigIntField(pk=True)
+    name: str = tortoise.fields.CharField(max_length=255)
+    name_lower: str = tortoise.fields.CharField(max_length=255, index=True)
+    acronym: str = tortoise.fields.CharField(max_length=255, default="")
+    created_at = tortoise.fields.DatetimeField(null=True)
+
+
+class SchemaFingerprints(tortoise.Model):
+    id: int = tortoise.fields.IntField(pk=True)
+    fingerprint: str = tortoise.fields.CharField(max_length=64)
+    updated_at = tortoise.fields.DatetimeField(auto_now=True)
+
+
+def _schema_fields(description: dict) -> list:
+    fields = [
+        description["pk_field"],
+        *description["data_fields"],
+        *description["fk_fields"],
+        *description["o2o_fields"],
+    ]
+
+    return [{key: field[key] for key in _SCHEMA_KEYS if key in field} for field in fields]
+
+
+def schema_fingerprint() -> str:
+    """
+    Hashes the table, column names, types and constraints of every model defined here.
+    Defaults and docstrings are left out, as they don't change the schema. Tortoise must already be initialised.
+    """
+    described = sorted(
+        (
+            {
+                "table": description["table"],
+                "unique_together": description["unique_together"],
+                "fields": _schema_fields(description),
+            }
+            for description in (
+                model.describe(serializable=True)
+                for model in tortoise.Tortoise.apps["models"].values()
+                if model.__module__ == __name__
+            )
+        ),
+        key=lambda description: description["table"],
+    )
+
+    return hashlib.sha256(json.dumps(described, sort_keys=True).encode()).hexdigest()
@@ -16,7 +16,7 @@
 
 
 from requiem import __discord__
-from requiem.lib import client
+from requiem.lib import DATA_DIR
 
 import yaml
 import click
@@ -130,6 +130,17 @@ def _get_postgres_database():
             return value
 
 
+def _get_pnw_api_keys():
+    click.echo(
+        "enter one or more politics and war api keys separated by commas or press enter to continue. "
+        "commands that query the politics and war api will be unavailable without one."
+    )
+
+    value = input()
+
+    return [key.strip() for key in value.split(",") if key.strip()]
+
+
 def _get_database_url():
     confirm = click.confirm("would you like for requiem to connect to a dedicated postgres server?")
 
@@ -148,7 +159,7 @@ def _get_database_url():
 
 def run_config() -> None:
     """Build the config file and all required directories."""
-    data_dir = client.DATA_DIR
+    data_dir = DATA_DIR
 
     if not data_dir.is_dir():
         click.echo("requiem was unable to find the app data directory! it will be created!")
@@ -183,7 +194,8 @@ def run_config() -> None:
 
     data = {
         "discord_token": _get_discord_token(),
-        "database_url": _get_database_url()
+        "database_url": _get_database_url(),
+        "pnw_api_keys": _get_pnw_api_keys(),
     }
 
     try:
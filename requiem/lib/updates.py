@@ -0,0 +1,111 @@
+# This is part of Requiem
+# Copyright (C) 2020  God Empress Verin
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from requiem import __version__
+
+import threading
+import pathlib
+import typing
+import click
+import json
+import time
+import re
+
+
+_VERSION_URL = "https://raw.githubusercontent.com/GodEmpressVerin/requiem/main/requiem/__init__.py"
+_CACHE_FILE = "update_check.json"
+
+
+def _read_cache(path: pathlib.Path, ttl: float, retry: float) -> typing.Tuple[bool, typing.Optional[str]]:
+    """
+    Returns whether the cached check is still fresh and the latest version it found.
+    Failed checks are only trusted for retry seconds so a brief outage doesn't hide updates for a whole ttl.
+    """
+    try:
+        with open(path) as stream:
+            data = json.load(stream)
+
+        latest = data["latest"]
+        age = time.time() - float(data["checked_at"])
+
+    except (OSError, ValueError, KeyError, TypeError):
+        return False, None
+
+    return 0 <= age < (ttl if latest else retry), latest
+
+
+def _write_cache(path: pathlib.Path, latest: typing.Optional[str]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, "w") as stream:
+            json.dump({"checked_at": time.time(), "latest": latest}, stream)
+
+    except OSError:
+        pass
+
+
+def fetch_latest_version(timeout: float) -> typing.Optional[str]:
+    """
+    Reads the version string of the main branch from github. Returns None if it couldn't be reached or read.
+    """
+    import requests
+
+    try:
+        page = requests.get(_VERSION_URL, timeout=timeout)
+
+    except requests.RequestException:
+        return None
+
+    match = re.findall(r"(?<=__version__ = ).*", page.text)
+
+    return match[0].strip('"') if match else None
+
+
+def check(
+    directory: pathlib.Path,
+    *,
+    ttl: float = 86400,
+    retry: float = 3600,
+    timeout: float = 2.0,
+) -> None:
+    """
+    Tells the user when a newer version of requiem is available.
+    Results are cached in directory so most invocations never touch the network.
+    """
+    path = directory / _CACHE_FILE
+    fresh, latest = _read_cache(path, ttl, retry)
+
+    if not fresh:
+        latest = fetch_latest_version(timeout)
+        _write_cache(path, latest)
+
+    if latest is None:
+        click.echo("requiem was unable to check for updates!")
+
+    elif latest != __version__:
+        click.echo(f"a newer version of requiem is available, consider upgrading to {latest}")
+
+
+def check_in_background(directory: pathlib.Path, **kwargs: typing.Any) -> threading.Thread:
+    """
+    Runs check in a daemon thread so it never holds up or outlives whatever it runs alongside.
+    """
+    thread = threading.Thread(target=check, args=(directory,), kwargs=kwargs, name="requiem-update-check", daemon=True)
+    thread.start()
+
+    return thread
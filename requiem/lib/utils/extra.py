@@ -15,58 +15,456 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+
+import asyncio
+import array
+import bisect
+import collections
+import importlib
+import json
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import sys
+import time
+import types
 import typing
 
 
+_LOGGER = logging.getLogger("requiem.extensions")
+_SNAPSHOT_MAGIC = b"RQAC"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<4sHIIII")
+
+
+def _grams(value: str, size: int) -> typing.Set[str]:
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class _Generation:
+    """
+    An immutable, searchable snapshot of the values held by an AutoCompleteIndex.
+    Prefixes are resolved by bisecting a sorted array of keys and infixes through bigram and trigram posting lists.
+    """
+
+    __slots__: typing.List[str] = ["_keys", "_values", "_postings"]
+
+    def __init__(self, values: typing.Iterable[str]) -> None:
+        display = {}
+
+        for value in values:
+            display.setdefault(value.lower(), value)
+
+        self._keys: typing.Tuple[str, ...] = tuple(sorted(display))
+        self._values: typing.Tuple[str, ...] = tuple(display[key] for key in self._keys)
+
+        postings: typing.Dict[str, array.array] = {}
+
+        for position, key in enumerate(self._keys):
+            for gram in _grams(key, 2) | _grams(key, 3):
+                if gram not in postings:
+                    postings[gram] = array.array("I")
+
+                postings[gram].append(position)
+
+        self._postings: typing.Dict[str, typing.Sequence[int]] = postings
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def values(self) -> typing.Tuple[str, ...]:
+        return self._values
+
+    def dump(self, metadata: dict) -> bytes:
+        """
+        Serializes the generation as a header followed by the value, gram, offset and posting sections.
+        """
+        grams = list(self._postings)
+        offsets = array.array("I", [0])
+        postings = array.array("I")
+
+        for gram in grams:
+            postings.extend(self._postings[gram])
+            offsets.append(len(postings))
+
+        if sys.byteorder != "little":
+            offsets.byteswap()
+            postings.byteswap()
+
+        values = "\0".join(self._values).encode()
+        grams = "\0".join(grams).encode()
+        metadata = json.dumps(metadata).encode()
+        header = _SNAPSHOT_HEADER.pack(
+            _SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, len(metadata), len(values), len(grams), len(offsets)
+        )
+
+        return b"".join((header, metadata, values, grams, offsets.tobytes(), postings.tobytes()))
+
+    @classmethod
+    def load(cls, buffer: typing.Union[bytes, mmap.mmap]) -> typing.Tuple["_Generation", dict]:
+        """
+        Restores a generation written by dump. Posting lists are views into buffer rather than copies.
+        """
+        magic, version, metadata_size, values_size, grams_size, offsets_count = _SNAPSHOT_HEADER.unpack_from(buffer)
+
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            raise ValueError("unsupported autocomplete snapshot!")
+
+        view = memoryview(buffer)
+        position = _SNAPSHOT_HEADER.size
+        sections = []
+
+        for size in (metadata_size, values_size, grams_size, offsets_count * 4):
+            sections.append(view[position:position + size])
+            position += size
+
+        metadata, values, grams, offsets = sections
+        postings = view[position:]
+
+        if sys.byteorder == "little":
+            offsets = offsets.cast("I")
+            postings = postings.cast("I")
+
+        else:
+            offsets, postings = array.array("I", offsets), array.array("I", postings)
+            offsets.byteswap()
+            postings.byteswap()
+
+        generation = cls.__new__(cls)
+        generation._values = tuple(bytes(values).decode().split("\0")) if values_size else ()
+        generation._keys = tuple(value.lower() for value in generation._values)
+        generation._postings = {
+            gram: postings[offsets[index]:offsets[index + 1]]
+            for index, gram in enumerate(bytes(grams).decode().split("\0") if grams_size else ())
+        }
+
+        return generation, json.loads(bytes(metadata))
+
+    def _infix(self, arg: str) -> typing.Iterator[int]:
+        """
+        Yields the positions of keys containing arg in ascending order.
+        """
+        if len(arg) == 1:
+            return (position for position, key in enumerate(self._keys) if arg in key)
+
+        if len(arg) <= 3:
+            return iter(self._postings.get(arg, ()))
+
+        candidates = min(
+            (self._postings.get(gram, ()) for gram in _grams(arg, 3)),
+            key=len,
+        )
+
+        return (position for position in candidates if arg in self._keys[position])
+
+    def search(self, arg: str, results: int) -> typing.List[str]:
+        """
+        Finds up to results values ranked by exact match, then prefix match, then infix match.
+        """
+        keys = self._keys
+        found: typing.List[int] = []
+        start = bisect.bisect_left(keys, arg)
+        end = start
+
+        while end < len(keys) and len(found) < results and keys[end].startswith(arg):
+            found.append(end)
+            end += 1
+
+        if len(found) < results:
+            for position in self._infix(arg):
+                if start <= position < end:
+                    continue
+
+                found.append(position)
+
+                if len(found) == results:
+                    break
+
+        return [self._values[position] for position in found]
+
+
+class _QueryCache:
+    """
+    A bounded LRU of search results. Invalidated whenever a new generation is swapped in.
+    """
+
+    __slots__: typing.List[str] = ["_entries", "_size", "hits", "misses", "evictions"]
+
+    def __init__(self, size: int) -> None:
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._size: int = size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: typing.Tuple[str, int]) -> typing.Optional[typing.Tuple[str, ...]]:
+        try:
+            value = self._entries[key]
+
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return value
+
+    def put(self, key: typing.Tuple[str, int], value: typing.Tuple[str, ...]) -> None:
+        if self._size <= 0:
+            return
+
+        self._entries[key] = value
+
+        if len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> None:
+        self._entries = collections.OrderedDict()
+
+
+class _HistoryStore:
+    """
+    Keeps the most recent searches for a bounded number of users. The least recently active user is dropped first.
+    """
+
+    __slots__: typing.List[str] = ["_entries", "_users", "_depth"]
+
+    def __init__(self, users: int, depth: int) -> None:
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._users: int = users
+        self._depth: int = depth
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user: int) -> typing.Tuple[str, ...]:
+        entry = self._entries.get(user, ())
+
+        if entry:
+            self._entries.move_to_end(user)
+
+        return entry
+
+    def push(self, user: int, value: str) -> None:
+        entry = self._entries.get(user, ())
+        self._entries[user] = ((value,) + tuple(item for item in entry if item != value))[:self._depth]
+        self._entries.move_to_end(user)
+
+        if len(self._entries) > self._users:
+            self._entries.popitem(last=False)
+
+
 class AutoCompleteIndex:
 
-    __slots__: typing.List[str] = ["_index", "__index", "_history"]
+    __slots__: typing.List[str] = ["_generation", "_pending", "_cache", "_history", "_rebuild_lock"]
 
-    def __init__(self):
-        self._index: set = set()
-        self.__index: set = set()
-        self._history: dict = dict()
+    def __init__(self, cache_size: int = 1024, history_users: int = 10000, history_depth: int = 5):
+        self._generation: _Generation = _Generation(())
+        self._pending: set = set()
+        self._cache: _QueryCache = _QueryCache(cache_size)
+        self._history: _HistoryStore = _HistoryStore(history_users, history_depth)
+        self._rebuild_lock: asyncio.Lock = asyncio.Lock()
 
     def __len__(self):
-        return len(self._index)
+        return len(self._generation)
 
-    @staticmethod
-    def _search(arg: str, iterable: typing.Iterable):
-        for item in set(iterable):
-            if item.startswith(arg) or arg in item:
-                yield item.title()
+    @property
+    def cache_info(self) -> dict:
+        cache = self._cache
+        lookups = cache.hits + cache.misses
+
+        return {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "evictions": cache.evictions,
+            "size": len(cache),
+            "hit_rate": cache.hits / lookups if lookups else 0.0,
+        }
 
     def insert(self, value: str) -> None:
-        self.__index.add(value.lower())
+        self._pending.add(value)
 
-    def update(self):
-        self._index = self.__index
-        self.__index = set()
+    def _swap(self, generation: _Generation) -> None:
+        self._generation = generation
+        self._cache.invalidate()
 
-    def search(self, arg: str, user: int, results: int = 5) -> list:
-        if arg:
-            results = list(self._search(arg.lower(), self._index))
+    def _take_pending(self, merge: bool) -> set:
+        pending, self._pending = self._pending, set()
 
-            if arg.title() not in results:
-                results.insert(0, arg.title())
+        if merge:
+            pending.update(self._generation.values)
 
-        else:
-            results = list(self._search("", self.history(user)))
+        return pending
+
+    def update(self, merge: bool = False):
+        self._swap(_Generation(self._take_pending(merge)))
+
+    async def rebuild(self, merge: bool = False) -> None:
+        """
+        Builds the next generation from the pending values in a worker thread and swaps it in once complete.
+        Searches keep being served from the current generation while the rebuild runs.
+        Passing merge keeps the current values in the next generation, for applying deltas.
+        """
+        async with self._rebuild_lock:
+            pending = self._take_pending(merge)
+            loop = asyncio.get_running_loop()
+            generation = await loop.run_in_executor(None, _Generation, pending)
+            self._swap(generation)
+
+    def save(self, path: pathlib.Path, metadata: typing.Optional[dict] = None) -> None:
+        """
+        Writes the current generation to a versioned snapshot file, replacing any existing snapshot atomically.
+        """
+        data = self._generation.dump(metadata or {})
+        temp = path.with_suffix(path.suffix + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
 
-        return results[:results]
+        with open(temp, "wb") as stream:
+            stream.write(data)
 
-    def record(self,  user: int, arg) -> None:
+        os.replace(temp, path)
+
+    def load(self, path: pathlib.Path) -> dict:
+        """
+        Memory maps a snapshot written by save and swaps it in as the current generation. Returns its metadata.
+        """
+        with open(path, "rb") as stream:
+            buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        generation, metadata = _Generation.load(buffer)
+        self._swap(generation)
+
+        return metadata
+
+    def search(self, arg: str, user: int, results: int = 5) -> list:
         arg = arg.lower()
-        history = self.history(user)
 
-        if arg not in history:
-            if len(history) == 5:
-                history.pop(5)
+        if not arg:
+            return [item.title() for item in self.history(user)][:results]
+
+        key = (arg, results)
+        cached = self._cache.get(key)
+
+        if cached is not None:
+            return list(cached)
 
-            history.insert(0, arg)
-            self._history[user] = history
+        found = self._generation.search(arg, results)
+
+        if not found or found[0].lower() != arg:
+            found.insert(0, arg.title())
+
+        found = found[:results]
+        self._cache.put(key, tuple(found))
+
+        return found
+
+    def record(self, user: int, arg: str) -> None:
+        arg = arg.lower()
+
+        if arg:
+            self._history.push(user, arg)
 
     def history(self, user: int) -> list:
-        if user in self._history.keys():
-            return self._history[user]
-        return []
+        return list(self._history.get(user))
+
+
+class TTLCache:
+    """
+    A bounded mapping whose entries expire ttl seconds after they were stored.
+    """
+
+    __slots__: typing.List[str] = ["_entries", "_size", "ttl"]
+
+    def __init__(self, ttl: float, size: int = 1024) -> None:
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._size: int = size
+        self.ttl: float = ttl
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: typing.Hashable) -> typing.Optional[typing.Any]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        expires, value = entry
+
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+
+        return value
+
+    def put(self, key: typing.Hashable, value: typing.Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+
+class LazyModule:
+    """
+    Defers importing an extension's command handlers until one of its commands is first invoked.
+    Like an extension, the module may define load(bot) and unload(bot), called when it is imported and unloaded.
+    """
+
+    __slots__: typing.List[str] = ["name", "_bot", "_module"]
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self._bot: typing.Any = None
+        self._module: typing.Optional[types.ModuleType] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def bind(self, bot: typing.Any) -> None:
+        self._bot = bot
+
+    def get(self) -> types.ModuleType:
+        """
+        Returns the module, importing and loading it first if this is the first time it was needed.
+        """
+        if self._module is None:
+            if self._bot is None:
+                raise RuntimeError(f"{self.name} was used before its extension was loaded!")
+
+            started = time.perf_counter()
+            module = importlib.import_module(self.name)
+
+            if hasattr(module, "load"):
+                module.load(self._bot)
+
+            self._module = module
+
+            _LOGGER.info(
+                "requiem has lazily loaded %s in %.2fms!", self.name, (time.perf_counter() - started) * 1000
+            )
+
+        return self._module
+
+    def unload(self) -> None:
+        """
+        Unloads the module if it was imported so it is imported fresh the next time it is needed.
+        """
+        module, self._module = self._module, None
+
+        if module is not None:
+            if hasattr(module, "unload"):
+                module.unload(self._bot)
+
+            sys.modules.pop(self.name, None)
+
+        self._bot = None